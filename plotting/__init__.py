@@ -1,20 +1,101 @@
-from typing import Callable, Iterable
-import pandas as pd
-from itertools import chain, accumulate
-from matplotlib import legend, pyplot as plt
-from matplotlib.axes import Axes
-from matplotlib.artist import Artist
-from matplotlib.figure import Figure
-import numpy as np
+from typing import Callable, Iterable, TYPE_CHECKING
+from itertools import accumulate
+from contextlib import contextmanager
+from functools import wraps
 import os
 import sys
+import time
+import warnings
+import numpy as np
 from os import path
-from .mpl import MPL_fig as _fig
+from .decimate import METHODS as _METHODS
+from .evaluate import evaluate as _evaluate
+from .sources import Source, ArraySource, csv_chunks, _file_id
+from .envelope import Envelope
+from .instrument import Recorder
+from .density import EyeHistogram, _sample_spacing
+from .spectrum import welch as _welch, log_average as _log_average
+from .spec import FigureSpec
+from .html import export_html as _export_html, FORMATS as _HTML_FORMATS
+from .cache import OutputCache, fingerprint as _fingerprint, new_hash as _new_hash
+from . import background as _background
+from .background import flush
 import __main__ as main
+if TYPE_CHECKING:
+	import pandas as pd
+	from concurrent.futures import Future
+	from .backend import Backend
+
+BACKENDS=("mpl","pqg")
+
+def _fig(title:str="",backend:str="mpl",**kwargs) -> 'Backend':
+	# the backends are only imported once a figure is made, so that importing this
+	# package doesn't drag in matplotlib (or Qt) for tools that never plot
+	if backend=="pqg":
+		from .pqg import PQG_fig
+		return PQG_fig(title,**kwargs)
+	if backend!="mpl":
+		raise ValueError(f"backend should be one of {BACKENDS}, got '{backend}'")
+	from .mpl import MPL_fig
+	return MPL_fig(title,**kwargs)
+
+# lines with more points than this are rasterized when saving to a vector format
+RASTERIZE_ABOVE=50_000
+VECTOR_FORMATS={'pdf','svg','svgz','eps','ps'}
+
+def _npoints(y) -> int:
+	try:
+		return len(y)
+	except TypeError:
+		return 0
+
+def _logged(method:Callable) -> Callable:
+	"""
+	Mark a method as one that changes what the figure looks like, so its calls are
+	folded into the key the output cache uses, and recorded in the spec if there is
+	one. Calls it makes to other logged methods aren't counted twice, unless the
+	outer call can't be recorded, in which case the inner ones are.
+	"""
+	@wraps(method)
+	def inner(self,*args,**kwargs):
+		if self._log_depth==0:
+			self._log_call(method.__name__,args,kwargs)
+		recorded=False
+		before=len(self.spec) if self.spec is not None else 0
+		if self.spec is not None and self._spec_depth==0:
+			recorded=self.spec.record(method.__name__,args,kwargs)
+		self._log_depth+=1
+		self._spec_depth+=recorded
+		try:
+			return method(self,*args,**kwargs)
+		finally:
+			self._log_depth-=1
+			self._spec_depth-=recorded
+			if self.spec is not None and self._spec_depth==0 and len(self.spec)==before:
+				warnings.warn(f"{method.__name__} couldn't be recorded, the spec won't draw it",stacklevel=2)
+	return inner
 
-__all__=['figure_wrapper']
+def _save_targets(pth:'str|Iterable',dpi:float|None,formats:Iterable[str]|None) -> list[tuple[str,float|None]]:
+	"""the (path,dpi) of every file figure_wrapper.save is asked for"""
+	targets=[]
+	for item in [pth] if isinstance(pth,str) else pth:
+		p,d=(item,dpi) if isinstance(item,str) else item
+		if formats is None:
+			targets.append((p,d))
+		else:
+			targets.extend((f"{path.splitext(p)[0]}.{fmt.lstrip('.')}",d) for fmt in formats)
+	return targets
+
+def _stored(pth:str,store:Callable[[str],object]) -> Callable:
+	"""a done callback that stores pth in the cache if the save worked"""
+	def callback(fut:'Future'):
+		if fut.exception() is None:
+			store(pth)
+	return callback
+
+__all__=['figure_wrapper','flush','FigureSpec']
 class figure_wrapper:
-	outfile:str
+	outfile:'str|list'
 	tighten:bool
 	figs:list
 	fig_idx:int
@@ -26,14 +107,83 @@ class figure_wrapper:
 	show_at_end:bool
 	fix_ticks_at_end:bool
 	_autoscale:bool
-	def __init__(self, outf:str="",interactive=False, show:bool=False, tighten:bool=False):
+	decimate:str
+	draws:int
+	headless:bool
+	recorder:Recorder
+	cache:OutputCache|None
+	async_save:str
+	future:'Future|None'
+	backend:str
+	spec:FigureSpec|None
+	def __init__(self, outf:'str|list'="",interactive=False, show:bool=False, tighten:bool=False, decimate:str="", headless:bool=False, instrument:Recorder|bool=False, cache:OutputCache|str|bool=False, async_save:str="", backend:str="mpl", record:bool=False, figsize=None, dpi=None):
+		"""
+		headless=True renders without pyplot at all: figures come from a pool of Agg
+		figures, nothing is shown or drawn interactively, and the figures go back to the
+		pool when the with block ends (or on close()). Use this for report services
+		that make figure after figure.
+
+		instrument=True records the time spent in each stage of making and saving the
+		figures and prints a summary when the with block ends. Pass a Recorder instead
+		to choose what's recorded and where it goes; it's kept as `recorder`.
+
+		cache=True skips saving a figure when the output file is already there and was
+		made from the same data, calls, style and format. A directory name also keeps
+		every output there by its key, so it can be copied back instead of rendered;
+		pass an OutputCache to set how big that store can get.
+
+		outf can be a list of files to save the figure to, as for save.
+
+		async_save="thread" or "process" saves `outf` in the background when the with
+		block ends, instead of waiting for it; the Future is kept as `future`, and
+		plotting.flush() waits for all of them (see save).
+
+		backend="pqg" draws with pyqtgraph instead of matplotlib, which stays responsive
+		with far larger traces, for looking through data interactively. It saves through
+		pyqtgraph's exporters, so it also works offscreen (QT_QPA_PLATFORM=offscreen).
+
+		record=True keeps every call that changes the figure in `spec`, a FigureSpec
+		that can be saved and replayed to draw it again, e.g. at another figsize (in
+		inches) or dpi, without the computations that went into it.
+		"""
+		self.spec=None
+		self._spec_depth=0
+		self.figsize=figsize
+		self.dpi=dpi
+		self.backend=backend
+		self.async_save=async_save
+		self.future=None
+		self._log_depth=0
+		self._digest=_new_hash()
+		if cache is True:
+			self.cache=OutputCache()
+		elif isinstance(cache,str):
+			self.cache=OutputCache(cache)
+		else:
+			self.cache=cache or None
+		self.headless=headless
+		if isinstance(instrument,Recorder):
+			self.recorder=instrument
+		else:
+			self.recorder=Recorder(enabled=instrument,report=True)
 		# All of this interactive stuff should be moved into the backends
+		if headless:
+			self.show_at_end=False
+			self.wait_save=False
+			self.interactive=False
+		# pyqtgraph runs its own event loop when shown, pyplot isn't involved
+		elif backend!="mpl":
+			self.show_at_end=show
+			self.wait_save=False
+			self.interactive=show
 		# if run from jupyter notebook
-		if "ipykernel" in sys.modules:
+		elif "ipykernel" in sys.modules:
 			self.show_at_end=False
 			self.wait_save=False
+			self.interactive=False
 		# if run from REPL
 		elif not hasattr(main,'__file__') or interactive:
+			from matplotlib import pyplot as plt
 			print("figure_wrapper called interactively!")
 			plt.ion()
 			self.interactive=True
@@ -41,23 +191,48 @@ class figure_wrapper:
 			self.show_at_end=False
 			self.wait_save=True
 		else:
+			from matplotlib import pyplot as plt
 			plt.ioff()
 			self.show_at_end=show
 			self.wait_save=False
 			self.interactive=show
-		self.figs=[_fig()]
+		self.figs=[_fig(backend=backend,headless=headless,figsize=figsize,dpi=dpi)]
 		self.fig_idx=0
 		self.fontsize=12
 		self.outfile=outf
 		self.make_legend=False
 		self.legend_loc="best"
 		self.autoscale=False
+		# the data limits of the spectra drawn on each axis, see spectrum
+		self._spectrum_lims={}
 		self.tighten=tighten
 		self.fix_ticks_at_end=False
+		self.decimate=decimate
+		self.draws=0
+		self._batch_depth=0
+		self._dirty=False
+		if record:
+			self.spec=FigureSpec({'tighten':tighten,'decimate':decimate,'backend':backend,'figsize':figsize,'dpi':dpi})
 	@property
 	def fig(self):
 		return self.figs[self.fig_idx]
+
+	def _log_call(self,name:str,args:tuple,kwargs:dict):
+		if self.cache is not None:
+			_fingerprint((name,args,kwargs),self._digest)
+
+	def cache_key(self,pth:str,tighten:bool,*save_args) -> str:
+		"""
+		The key of the current figure as it would be saved to pth: everything plotted
+		so far, the settings applied when saving, the backend's style and the format
+		"""
+		h=self._digest.copy()
+		_fingerprint((self.fig_idx,path.splitext(pth)[1].lower(),tighten,save_args,
+			self.make_legend,self.legend_loc,self.autoscale,self.fix_ticks_at_end,
+			self.backend,self.fig.style),h)
+		return h.hexdigest()
 	
+	@_logged
 	def set_title(self,t:str):
 		self.fig.title=t
 	def process_args(self,
@@ -70,44 +245,288 @@ class figure_wrapper:
 						name:str="",
 						yy:bool=False,
 						**kwargs):
-		if legend_loc !="":
-			self.legend_loc=legend_loc
-		if plot_loc != -1:
-			self.fig.axis=plot_loc-1
-		if newplot:
-			self.figs.append(_fig())
-			self.fig_idx=len(self.figs)-1
-		if fig !=-1:
-			self.fig_idx=fig
-		if not hold:
-			self.fig.clear()
-		if prompt_for_resize:
-			self.wait_save=True
-		# default plotting options
-		if name !="":
-			self.make_legend=True
-		if yy:
-			self.fig.axes.append(self.fig.axis.twinx())
-			self.fig.axis=len(self.fig.axes)-1
-			if "color" in kwargs:
-				self.fig.axis.tick_params(axis='y',labelcolor=kwargs['color'])
-		kwargs['label']=name
-		if not "lw" in kwargs and not "linewidth" in kwargs:
-			kwargs['lw']=2
+		with self.recorder.stage("process_args",self.fig_idx):
+			if legend_loc !="":
+				self.legend_loc=legend_loc
+			if plot_loc != -1:
+				self.fig.axis=plot_loc-1
+			if newplot:
+				self.figs.append(_fig(backend=self.backend,headless=self.headless,figsize=self.figsize,dpi=self.dpi))
+				self.fig_idx=len(self.figs)-1
+			if fig !=-1:
+				self.fig_idx=fig
+			if not hold:
+				self.fig.clear()
+			if prompt_for_resize:
+				self.wait_save=True
+			# default plotting options
+			if name !="":
+				self.make_legend=True
+			if yy:
+				self.fig.axes.append(self.fig.axis.twinx())
+				self.fig.axis=len(self.fig.axes)-1
+				if "color" in kwargs:
+					self.fig.axis.tick_params(axis='y',labelcolor=kwargs['color'])
+			kwargs['label']=name
+			if not "lw" in kwargs and not "linewidth" in kwargs:
+				kwargs['lw']=2
 
+			return kwargs
 
-		return kwargs
+	def source(self,x:'Iterable|Source',y:Iterable|None,decimate:str|None=None) -> 'Source|None':
+		"""
+		The full resolution trace to decimate from, or None if the data is to be drawn
+		as it is. `decimate` overrides the default given to the constructor for this
+		one call; "" or "none" turns it off.
+		"""
+		method=self.decimate if decimate is None else decimate
+		if isinstance(x,Source):
+			if y is not None:
+				raise TypeError("y should not be given when plotting a Source")
+			return x
+		if method in ("","none"):
+			return None
+		if method not in _METHODS:
+			raise ValueError(f"Unknown decimation method '{method}', expected one of {_METHODS}")
+		# pyqtgraph reduces curves to the view itself, and can only do that from all of it
+		if self.fig.downsamples:
+			return None
+		src=ArraySource(x,y,method)
+		if src._ys.ndim != 1 or src._xs.shape != src._ys.shape:
+			return None
+		return src
 
+	def trace(self,func:Callable,x:'Iterable|Source',y:Iterable|None,decimate:str|None,plot_args:dict,log_x:bool=False):
+		"""
+		Draw the trace with func, one of the backend's plotting methods. Decimated
+		traces are registered with the backend so they get re-decimated from the full
+		data when the x limits change. `log_x` says func draws on a log x axis.
+		"""
+		src=self.source(x,y,decimate)
+		if src is None:
+			with self.recorder.stage("artists",self.fig_idx,_npoints(y)):
+				return func(x,y,**plot_args)
+		full=decimate=="none"
+		# arrays keep the method they were given; a file is only ever reduced by min/max,
+		# in bins of log(x) on a log x axis (see _log_decimate)
+		method=None
+		if not isinstance(src,ArraySource):
+			method="log" if log_x else "minmax"
+		with self.recorder.stage("decimate",self.fig_idx,len(src)):
+			x,y=src.read(max_points=None if full else 4*self.fig.pixel_width,method=method)
+		with self.recorder.stage("artists",self.fig_idx,len(y)):
+			lines=func(x,y,**plot_args)
+		if lines and not full and src.numeric_x:
+			self.fig.track(lines[0],src,method)
+		return lines
+
+	@_logged
 	def plot(self,
-			 x:Iterable,
-			 y:Iterable,/,
+			 x:'Iterable|Source',
+			 y:Iterable|None=None,/,
+			 decimate:str|None=None,
 			 **kwargs):
 		plot_args=self.process_args(**kwargs)
-		self.fig.plot(x,y,**plot_args) #pyright:ignore
+		self.trace(self.fig.plot,x,y,decimate,plot_args)
 		self.draw()
 
-	def pd(self,func:Callable,series:list[pd.Series],**kwargs) -> None:
-		if func.__name__=="plot2":
+	@_logged
+	def plot_many(self,
+				  x:Iterable,
+				  Y:Iterable,/,
+				  colors=None,
+				  cmap=None,
+				  **kwargs):
+		"""
+		Plot each row of Y against x (shared, or one row per trace) as one artist, for
+		overlaying many runs. `name` labels the whole set in the legend.
+		"""
+		plot_args=self.process_args(**kwargs)
+		self.fig.plot_many(x,Y,colors=colors,cmap=cmap,**plot_args)
+		self.draw()
+
+	@_logged
+	def density(self,
+				y:'Iterable|Source',
+				x:Iterable|None=None,/,
+				period:float|None=None,
+				span:float|None=None,
+				trigger:float|None=None,
+				offset:float=0.0,
+				dt:float=1.0,
+				yrange:tuple[float,float]|None=None,
+				bins:tuple[int,int]=(400,256),
+				fill:int|None=None,
+				cmap:str="viridis",
+				**kwargs) -> EyeHistogram:
+		"""
+		Draw an eye diagram: the trace cut into `period` (or trigger) aligned segments,
+		all overlaid as a 2-D histogram and shown as an image on a log color scale.
+
+		y is the trace, at x (dt is then measured from it) or spaced by dt, or a Source,
+		which is read a chunk at a time so only the histogram has to fit in memory.
+		`yrange` defaults to the range of the data, which costs one more pass over it.
+		See EyeHistogram for the rest.
+		The histogram is returned, so more data can be added to it and drawn again.
+		"""
+		if isinstance(y,Source):
+			src=y
+			# dt sets how finely the trace is filled in, so it has to be in the units of x
+			dt=src.dt if src.evenly_spaced else _sample_spacing(src.x(0,min(len(src),src.chunk)),dt)
+			chunks=lambda:((src.y(i,i+src.chunk),src.x(i,i+src.chunk)) for i in range(0,len(src),src.chunk))
+		else:
+			if x is not None:
+				dt=_sample_spacing(x,dt)
+			chunks=lambda:[(y,x)]
+		if yrange is None:
+			lims=[(np.nanmin(c),np.nanmax(c)) for c,_ in chunks()]
+			yrange=(min(l for l,_ in lims),max(h for _,h in lims))
+			if yrange[0]==yrange[1]:
+				yrange=(yrange[0]-0.5,yrange[1]+0.5)
+		hist=EyeHistogram(yrange,period,span,trigger,offset,bins,dt,fill)
+		with self.recorder.stage("density",self.fig_idx,_npoints(y)):
+			for ys,xs in chunks():
+				hist.add(ys,xs)
+		with self.recorder.stage("artists",self.fig_idx):
+			self.fig.density(hist.counts,hist.extent,cmap,**kwargs)
+		self.draw()
+		return hist
+
+	@_logged
+	def csv(self,
+			pth:str,
+			y:str,
+			x:str|None=None,/,
+			bins:int=2000,
+			mean:bool=True,
+			chunksize:int=1<<20,
+			engine:str="pandas",
+			refresh:float=0.5,
+			x0:float=0.0,
+			dt:float=1.0,
+			read_args:dict|None=None,
+			**kwargs) -> Envelope:
+		"""
+		Plot the min/max envelope of column y of a CSV file, and its mean, against
+		column x, or against the row number (from x0 in steps of dt) if there isn't one.
+
+		The file is read a chunk at a time (see sources.csv_chunks for `engine`,
+		`chunksize` and `read_args`) and reduced to `bins` to 2*`bins` bins as it goes,
+		so a file of any size takes the same memory. On screen the plot is redrawn
+		every `refresh` seconds while the rest is still being read. The Envelope is
+		returned.
+		"""
+		plot_args=self.process_args(**kwargs)
+		self._log_call("csv",(_file_id(pth),),{})
+		env=Envelope(bins)
+		live=not (self.headless or self.show_at_end)
+		artists=None
+		shown=time.perf_counter()
+		chunks=csv_chunks(pth,y,x,chunksize,engine,**(read_args or {}))
+		while True:
+			with self.recorder.stage("read_csv",self.fig_idx):
+				chunk=next(chunks,None)
+			if chunk is None:
+				break
+			xs,ys=chunk
+			if xs is None:
+				xs=x0+dt*np.arange(env.count,env.count+len(ys))
+			with self.recorder.stage("envelope",self.fig_idx,len(ys)):
+				env.add(xs,ys)
+			if live and time.perf_counter()-shown > refresh:
+				artists=self._draw_envelope(env,mean,artists,plot_args)
+				# nothing else runs the event loop until the whole file has been read
+				self.fig.flush_events()
+				shown=time.perf_counter()
+		self._draw_envelope(env,mean,artists,plot_args)
+		if x is not None:
+			self.set_labels(xlab=x)
+		return env
+
+	def _draw_envelope(self,env:Envelope,mean:bool,artists,plot_args:dict):
+		xs,lo,hi,avg=env.result()
+		with self.recorder.stage("artists",self.fig_idx,len(xs)):
+			artists=self.fig.envelope(xs,lo,hi,avg if mean else None,artists,**plot_args)
+		self.draw()
+		return artists
+
+	@_logged
+	def spectrum(self,
+				 y:'Iterable|Source',
+				 fs:float|None=None,/,
+				 nperseg:int=4096,
+				 overlap:float=0.5,
+				 window="hann",
+				 scaling:str="density",
+				 db:bool=False,
+				 log_bins:int|None=None,
+				 parallel:str="",
+				 workers:int|None=None,
+				 **kwargs) -> tuple[np.ndarray,np.ndarray]:
+		"""
+		Plot the Welch spectrum of y, sampled at fs (1/dt for a Source), on log axes,
+		or against log frequency in dB if `db`.
+
+		The segments are transformed a chunk at a time, on a thread pool with
+		parallel="thread", so a Source of any length takes bounded memory; see
+		spectrum.welch for the options. Above a few hundred Hz a long segment gives far
+		more frequencies per decade than there are pixels, so the power is averaged into
+		`log_bins` log-spaced bins (two per pixel by default, 0 to draw every frequency).
+		DC is left off. The full resolution frequencies and spectrum are returned.
+		"""
+		if fs is None:
+			fs=1/y.dt if isinstance(y,Source) else 1.0
+		with self.recorder.stage("spectrum",self.fig_idx,_npoints(y)):
+			f,p=_welch(y,fs,nperseg,overlap,window,scaling,parallel=parallel,workers=workers)
+		if log_bins is None:
+			log_bins=2*self.fig.pixel_width
+		with self.recorder.stage("decimate",self.fig_idx,len(f)):
+			fb,pb=_log_average(f[1:],p[1:],log_bins)
+		if db:
+			with np.errstate(divide='ignore'):
+				pb=(20 if scaling=="magnitude" else 10)*np.log10(pb)
+			self.slogx(fb,pb,decimate="none",**kwargs)
+		else:
+			self.loglog(fb,pb,decimate="none",**kwargs)
+		# the range is known here, unlike for a plain plot, so fit it to the data the
+		# way density does, taking in the other spectra already on the axis
+		good=pb[np.isfinite(pb)&((pb>0) | db)]
+		if len(fb) > 1 and len(good) and not self.autoscale:
+			key=(self.fig_idx,id(self.fig.axis))
+			lims=(fb[0],fb[-1],good.min(),good.max())
+			if key in self._spectrum_lims:
+				old=self._spectrum_lims[key]
+				lims=(min(old[0],lims[0]),max(old[1],lims[1]),min(old[2],lims[2]),max(old[3],lims[3]))
+			self._spectrum_lims[key]=lims
+			left,right,lo,hi=lims
+			self.set_xlim(left,right)
+			self.set_ylim(*((lo-3,hi+3) if db else (lo/2,hi*2)))
+		self.set_labels(xlab="frequency")
+		return f,p
+
+	@_logged
+	def stream(self,name:str,y:Iterable,x:Iterable|None=None,/,**kwargs):
+		"""
+		Append a chunk of live data to the named trace on the current figure.
+		See the backend's stream for the options.
+		"""
+		self.make_legend=True
+		self.fig.stream(name,y,x,**kwargs)
+
+	@_logged
+	def pd(self,func:Callable,series:'list[pd.Series]|pd.DataFrame',columns:Iterable|None=None,**kwargs) -> None:
+		"""
+		Plot pandas data against its index with func, one of the plotting methods
+		(e.g. figure_wrapper.plot).
+
+		series is either a list of Series, of which the first (or first two for plot2)
+		are plotted, or a DataFrame. For a DataFrame every column, or just `columns`,
+		is plotted on the current axes and named after its column. The index and the
+		columns are taken out once as numpy views rather than copied.
+		"""
+		if hasattr(series,"columns"):
+			self._pd_frame(func,series,columns,**kwargs) #pyright:ignore
+		elif func.__name__=="plot2":
 			self.plot2(
 				  series[0].index, 
 				  series[0],
@@ -123,36 +542,85 @@ class figure_wrapper:
 		  series[0],
 		  **kwargs)
 
+	def _pd_frame(self,func:Callable,df:'pd.DataFrame',columns:Iterable|None=None,**kwargs) -> None:
+		cols=list(df.columns) if columns is None else list(columns)
+		x=df.index.to_numpy()
+		ys=[df[c].to_numpy() for c in cols]
+		if func.__name__=="plot2":
+			self.plot2(x,ys[0],ys[1],
+				xlab=str(df.index.name),
+				ylab1=str(cols[0]),
+				ylab2=str(cols[1]),
+				**kwargs)
+			return
+		kwargs.pop("name",None)
+		# these pick or change the figure and axes, which has to happen once for the
+		# whole frame, so they only go with the first column (and get recorded with it)
+		layout={k:kwargs.pop(k) for k in ("newplot","hold","fig","plot_loc","yy","prompt_for_resize","legend_loc") if k in kwargs}
+		with self.batch():
+			for i,(c,y) in enumerate(zip(cols,ys)):
+				func(self,x,y,name=str(c),**kwargs,**(layout if i==0 else {}))
+			if df.index.name is not None:
+				self.set_labels(xlab=str(df.index.name))
+
+	def _log_decimate(self,decimate:str|None) -> str|None:
+		"""
+		Equal-count min/max bins don't line up with the pixel columns of a log x axis,
+		so traces on one are binned in log(x) instead (see decimate.logminmax)
+		"""
+		method=self.decimate if decimate is None else decimate
+		return "log" if method=="minmax" else decimate
+
+	@_logged
 	def slogx(self,
-			  x:Iterable,
-			  y:Iterable,/,
+			  x:'Iterable|Source',
+			  y:Iterable|None=None,/,
+			  decimate:str|None=None,
 			  **kwargs):
 		plot_args=self.process_args(**kwargs)
-		self.fig.semilogx(x,y,**plot_args) #pyright:ignore
+		self.trace(self.fig.semilogx,x,y,self._log_decimate(decimate),plot_args,log_x=True)
 		self.draw()
 
+	@_logged
 	def slogy(self,
-			  x:Iterable,
-			  y:Iterable,/,
+			  x:'Iterable|Source',
+			  y:Iterable|None=None,/,
+			  decimate:str|None=None,
 			  **kwargs):
 		plot_args=self.process_args(**kwargs)
-		self.fig.semilogy(x,y,**plot_args) #pyright:ignore
+		self.trace(self.fig.semilogy,x,y,decimate,plot_args)
 		self.draw()
 
+	@_logged
 	def loglog(self,
-			  x:Iterable,
-			  y:Iterable,/,
+			  x:'Iterable|Source',
+			  y:Iterable|None=None,/,
+			  decimate:str|None=None,
 			  **kwargs):
 		plot_args=self.process_args(**kwargs)
-		self.fig.loglog(x,y,**plot_args) #pyright:ignore
+		self.trace(self.fig.loglog,x,y,self._log_decimate(decimate),plot_args,log_x=True)
 		self.draw()
 
+	@_logged
 	def pfunc(self,
 			  x:Iterable,
 			  f:Callable[[Iterable],Iterable],/,
+			  parallel:str="",
+			  workers:int|None=None,
+			  chunksize:int=1<<16,
+			  cache:bool=False,
 			  **kwargs):
-		self.plot(x,np.vectorize(f)(x),**kwargs)
+		"""
+		Plot f over x. f is called on the whole array if it can take one, otherwise
+		element by element in chunks; see plotting.evaluate.evaluate for the options.
+		"""
+		y=_evaluate(f,x,chunksize=chunksize,parallel=parallel,workers=workers,cache=cache)
+		# f is only hashed by its code, which misses the globals and functions it calls,
+		# so the values it gave go in the output cache's key too
+		self._log_call("pfunc_y",(y,),{})
+		self.plot(x,y,**kwargs)
 
+	@_logged
 	def plot2(self,
 				x:Iterable,
 				y1:Iterable,
@@ -161,27 +629,26 @@ class figure_wrapper:
 				ylab1:str="",
 				ylab2:str="",
 				adjust_ticks:bool=False,
+				decimate:str|None=None,
 				**kwargs):
 		plot_args=self.process_args(**kwargs)
 		if self.fig.num_subfigs < 2:
 			self.fig.create_axes(2,1)
 		self.fig.axis=0
-		self.fig.plot(x,y1,**plot_args)
+		self.trace(self.fig.plot,x,y1,decimate,plot_args)
 		self.fig.set_ylabel(ylab1)
 		self.fig.axis=1
-		self.fig.plot(x,y2,**plot_args)
+		self.trace(self.fig.plot,x,y2,decimate,plot_args)
 		self.fig.sharex(self.fig.axes[0])
 		self.fig.set_ylabel(ylab2)
-		self.fig.axis.set_xlabel(xlab)
+		self.fig.set_xlabel(xlab)
 		self.draw()
 		if adjust_ticks:
 			self.fix_ticks_at_end = True
 
+	@_logged
 	def axline(self,loc:float,axis="x"):
-		if axis=="x":
-			plt.axvline(loc,linewidth=2,color='k',linestyle='dashed')
-		else:
-			plt.axhline(loc,linewidth=2,color='k',linestyle='dashed')
+		self.fig.axline(loc,axis)
 
 	def fix_ticks(self):
 		tks=self.fig.axes[0].get_xticklabels()
@@ -193,37 +660,141 @@ class figure_wrapper:
 		print(xlab)
 		self.fig.axes[1].set_xlabel(xlab + f' ({t_delta}µs/division)')
 
-	def save(self,pth:str, wait_save=False, tighten:bool=True):
+	def save(self,pth:'str|Iterable', wait_save=False, tighten:bool=True, rasterize_above:int|None=None, raster_dpi:float=300, background:str="", dpi:float|None=None, formats:Iterable[str]|None=None):
+		"""
+		Save the current figure to pth. In vector formats, lines with more than
+		`rasterize_above` points (default RASTERIZE_ABOVE) are rasterized at `raster_dpi`;
+		pass rasterize_above=0 to keep everything as vectors.
+
+		pth can also be a list of paths, or of (path,dpi) pairs, and `formats` a list of
+		extensions to save each path with in place of its own, e.g.
+		save("out/fig",formats=("png","pdf","svg")). The figure is laid out once for
+		all of them rather than once per file. An .html path gets a page that can be
+		zoomed into the full data offline, see html.export_html. `dpi` is the default for paths without
+		one, the figure's own if None.
+
+		background="thread" or "process" lays the figure out and writes it on a pool
+		and returns a Future for it; otherwise this returns None once the file is
+		written. In a thread the figure itself is rendered, so leave it alone until
+		the future is done; several files are written one after the other, as a figure
+		can only be drawn by one thread at a time. A process gets a pickled copy, so the
+		figure is free straight away, and several files are written at the same time,
+		one per process. An on-screen figure is always saved here and now.
+		plotting.flush() waits for every background save.
+		"""
+		if rasterize_above is None:
+			rasterize_above=RASTERIZE_ABOVE
+		targets=_save_targets(pth,dpi,formats)
+		keys={}
+		# nothing to go on if the figure is about to be resized by hand
+		if self.cache is not None and not (self.wait_save|wait_save):
+			todo=[]
+			for p,d in targets:
+				key=self.cache_key(p,tighten,rasterize_above,raster_dpi,*(() if d is None else (d,)))
+				if self.cache.fetch(key,path.abspath(p)):
+					print(f"{p} is up to date")
+				else:
+					keys[p]=key
+					todo.append((p,d))
+			targets=todo
+			if not targets:
+				return _background.done() if background else None
 		self.fig.tighten=tighten
 		if self.fix_ticks_at_end:
-			self.fix_ticks()
+			with self.recorder.stage("fix_ticks",self.fig_idx):
+				self.fix_ticks()
 		if self.make_legend:
-			self.fig.axis.legend(loc=self.legend_loc,draggable=wait_save)
+			with self.recorder.stage("legend",self.fig_idx):
+				self.fig.legend(loc=self.legend_loc,draggable=wait_save)
 		if self.autoscale:
-			plt.autoscale(True, axis='y',tight=False)
+			self.fig.autoscale(True,tight=False)
 		if self.wait_save|wait_save:
 			input("Please resize the image as desired, then hit enter")
-		fig_saver(self.fig).save(pth)
+		saver=fig_saver(self.fig,self.recorder,self.fig_idx)
+		cache=self.cache
+		def store(p:str):
+			if p in keys:
+				cache.store(keys[p],path.abspath(p)) #pyright:ignore
+		# Qt widgets can only be drawn from the thread that made them
+		if not background or self.interactive or self.backend!="mpl":
+			saver.save_all(targets,rasterize_above or None,raster_dpi,done=store)
+			return _background.done() if background else None
+		if background=="process":
+			import pickle
+			# the pickled figure would only have the lines as drawn, not their full data
+			html=[t for t in targets if path.splitext(t[0])[1].lower().lstrip('.') in _HTML_FORMATS]
+			if html:
+				saver.save_all(html,done=store)
+				targets=[t for t in targets if t not in html]
+				if not targets:
+					return _background.done()
+			# lay the figure out here once, rather than in every worker
+			tighten_there=self.fig.tighten and len(targets)==1
+			if not tighten_there:
+				saver.prep_fig_for_save()
+			data=pickle.dumps(self.fig.fig)
+			futs=[]
+			for p,d in targets:
+				fut=_background.submit("process",_background.save_pickled,data,tighten_there,p,rasterize_above or None,raster_dpi,d)
+				fut.add_done_callback(_stored(p,store))
+				futs.append(fut)
+			return futs[0] if len(futs)==1 else _background.gather(futs)
+		return _background.submit(background,saver.save_all,targets,rasterize_above or None,raster_dpi,done=store)
 	
+	@_logged
 	def set_xlim(self,left:float,right:float):
-		self.fig.axis.set_xlim(left,right)
+		self.fig.set_xlim(left,right)
+		self.fig.rezoom()
 
+	@_logged
 	def set_ylim(self,bot:float,top:float):
-		self.fig.axis.set_ylim(bot,top)
+		self.fig.set_ylim(bot,top)
 
+	@_logged
 	def set_labels(self,xlab:str|None=None,ylab:str|None=None,ax:int=-1,**kwargs):
 		if ax==-1:
 			ax=self.fig._axis
 		if xlab:
-			self.fig.axes[ax].set_xlabel(xlab,kwargs)
+			self.fig.set_xlabel(xlab,ax,**kwargs)
 		if ylab:
-			self.fig.axes[ax].set_ylabel(ylab,kwargs)
+			self.fig.set_ylabel(ylab,ax,**kwargs)
 		self.draw()
 
 	def draw(self):
-		if not self.show_at_end:
-			plt.draw()
+		"""
+		Redraw the figure, or inside a batch, mark it as needing a redraw at the end.
+		`draws` counts the redraws actually done.
+		"""
+		if self.show_at_end or self.headless:
+			return
+		if self._batch_depth > 0:
+			self._dirty=True
+			return
+		self.fig.draw()
+		self._dirty=False
+		self.draws+=1
+
+	@contextmanager
+	def batch(self):
+		"""
+		Hold off redrawing until the block ends, then redraw once if anything changed:
+
+			with fw.batch():
+				for y in traces:
+					fw.plot(x,y)
+				fw.set_labels("x","y")
+
+		Batches can be nested, only the outermost one redraws.
+		"""
+		self._batch_depth+=1
+		try:
+			yield self
+		finally:
+			self._batch_depth-=1
+			if self._batch_depth==0 and self._dirty:
+				self.draw()
 	
+	@_logged
 	def set_fontsize(self,fs):
 		self.fig.fontsize=fs
 		self.draw()
@@ -232,12 +803,13 @@ class figure_wrapper:
 	def autoscale(self):
 		return self._autoscale
 	@autoscale.setter
+	@_logged
 	def autoscale(self,val:bool):
 		self._autoscale=val
-		plt.autoscale(val, axis='y',tight=True)
+		self.fig.autoscale(val,tight=True)
 	@property
 	def xlim(self):
-		return self.fig.axes[0].get_xlim()
+		return self.fig.get_xlim(0)
 	@xlim.setter
 	def xlim(self,lim:tuple):
 		self.set_xlim(lim[0],lim[1])
@@ -246,10 +818,11 @@ class figure_wrapper:
 	@property
 	def ylim(self) -> tuple[tuple[float,float]]:
 		lims=[]
-		for ax in self.fig:
-			lims.append(ax.get_ylim())
+		for ax in range(len(self.fig.axes)):
+			lims.append(self.fig.get_ylim(ax))
 		return tuple(lims)
 	@ylim.setter
+	@_logged
 	def ylim(self,lims:tuple):
 		"""
 		If lims is two elements long, this is interpreted as (bot,top), with the graph to 
@@ -261,30 +834,48 @@ class figure_wrapper:
 		else:
 			(start,stop)=lims
 			sel=0
-		self.fig.axes[sel].set_ylim(start,stop)
+		self.fig.set_ylim(start,stop,sel)
 		self.draw()
 
 	def __enter__(self):
 		return self
 	def __exit__(self,*_):
-		for ax in self.fig:
-			ax.grid(visible=True)
+		self.fig.grid(True)
 		if self.show_at_end:
-			plt.show()
-		if self.outfile !="":
-			self.save(self.outfile,wait_save=self.wait_save,tighten=self.tighten)
+			self.fig.show()
+		if self.outfile:
+			self.future=self.save(self.outfile,wait_save=self.wait_save,tighten=self.tighten,background=self.async_save)
+		if self.future is not None:
+			self.future.add_done_callback(lambda _:self._finish())
+		else:
+			self._finish()
+
+	def _finish(self):
+		if self.recorder.enabled and self.recorder.report:
+			self.recorder.dump()
+		if self.headless:
+			self.close()
+
+	def close(self):
+		"""Close every figure of this wrapper, returning them to the pool if headless"""
+		for fig in self.figs:
+			fig.close()
+		self.figs=[]
 	
 	def __del__(self):
 		for fig in self.figs:
 			del fig
 
 class fig_saver:
-	def __init__(self,fig:_fig):
+	def __init__(self,fig:'Backend',recorder:Recorder|None=None,fig_idx:int=0):
 		self.fig=fig
+		self.recorder=recorder or Recorder(enabled=False)
+		self.fig_idx=fig_idx
 
 	def prep_fig_for_save(self):
 		if self.fig.tighten:
-			self.fig.fig.tight_layout()
+			with self.recorder.stage("tight_layout",self.fig_idx):
+				self.fig.tight_layout()
 		# for ax in self.fig:
 		# 	ax.grid(visible=True)
 		# 	ys=list(ax.get_ylim())
@@ -296,21 +887,80 @@ class fig_saver:
 		# 	ys[1]+=delta
 		# 	ax.set_ylim(ys)
 	
-	def create_dirs(self,pth):
+	def create_dirs(self,pth,walk:bool=True):
 		if pth.startswith('/'):
 			all_breaks=pth[1:].split('/')
 			all_breaks[0]='/'+all_breaks[0]
 		else:
 			all_breaks=pth.split('/')
 		dirs_made=[]
-		for dir in accumulate(all_breaks[:-1],func=lambda a,b:f'{a}/{b}'):
+		for dir in accumulate(all_breaks[:-1],func=lambda a,b:f'{a}/{b}') if walk else ():
 			if not path.exists(dir):
-				os.mkdir(dir)
+				# another thread or process may get there first
+				os.makedirs(dir,exist_ok=True)
 		print(f"saving {all_breaks[-1]} to folder {'/'.join(all_breaks[:-1])}")
 
-	def save(self,pth):
+	@staticmethod
+	def _npoints(artist) -> int:
+		if hasattr(artist,"get_xydata"):
+			return len(artist.get_xydata())
+		if hasattr(artist,"get_segments"):
+			return sum(len(seg) for seg in artist.get_segments())
+		if hasattr(artist,"get_offsets"):
+			return len(artist.get_offsets())
+		return 0
+
+	@contextmanager
+	def rasterized(self,above:int|None):
+		"""
+		Rasterize the lines and collections with more than `above` points while in the
+		block, leaving the axes, text and legends as vectors
+		"""
+		dense=[]
+		if above is not None:
+			for ax in self.fig:
+				# only matplotlib axes have artists to rasterize
+				for artist in [*getattr(ax,'lines',()),*getattr(ax,'collections',())]:
+					if not artist.get_rasterized() and self._npoints(artist) > above:
+						dense.append(artist)
+		for artist in dense:
+			artist.set_rasterized(True)
+		try:
+			yield dense
+		finally:
+			for artist in dense:
+				artist.set_rasterized(False)
+
+	def save(self,pth,rasterize_above:int|None=RASTERIZE_ABOVE,raster_dpi:float=300,dpi:float|None=None):
+		"""
+		Save to pth, at `dpi` if given. For vector formats, artists with more than
+		`rasterize_above` points are drawn as images at `raster_dpi` so the file stays
+		small; None turns that off.
+		"""
+		self.save_all([(pth,dpi)],rasterize_above,raster_dpi)
+
+	def save_all(self,targets:Iterable[tuple[str,float|None]],rasterize_above:int|None=RASTERIZE_ABOVE,raster_dpi:float=300,done:Callable[[str],object]|None=None):
+		"""
+		Save to every (pth,dpi) of targets as save does, laying the figure out once for
+		all of them. `done` is called with each path once it's written.
+		"""
 		self.prep_fig_for_save()
-		pth=path.abspath(pth)
-		self.create_dirs(pth)
-		self.fig.fig.savefig(fname=pth)
+		made=set()
+		for pth,dpi in targets:
+			out=path.abspath(pth)
+			with self.recorder.stage("create_dirs",self.fig_idx):
+				self.create_dirs(out,walk=path.dirname(out) not in made)
+			made.add(path.dirname(out))
+			ext=path.splitext(out)[1].lower().lstrip('.')
+			if ext in _HTML_FORMATS:
+				with self.recorder.stage("html",self.fig_idx):
+					_export_html(self.fig,out)
+				if done is not None:
+					done(pth)
+				continue
+			with self.rasterized(rasterize_above if ext in VECTOR_FORMATS else None) as dense:
+				with self.recorder.stage("savefig",self.fig_idx):
+					self.fig.save(out,dpi if dpi is not None else (raster_dpi if dense else None))
+			if done is not None:
+				done(pth)
 		# plt.close('all')
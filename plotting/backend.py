@@ -1,20 +1,27 @@
 """
 Defines the protocol for all backends
 """
-from typing import Iterable, Protocol, Iterator
-from pyqtgraph import GraphicsLayoutWidget, AxisItem
-from matplotlib.figure import Figure
-from matplotlib.axes import Axes
+from __future__ import annotations
+from typing import Iterable, Protocol, Iterator, TYPE_CHECKING
+# only needed for the annotations, importing them for real would pull in Qt
+if TYPE_CHECKING:
+	import numpy as np
+	from pyqtgraph import GraphicsLayoutWidget, AxisItem
+	from matplotlib.figure import Figure
+	from matplotlib.axes import Axes
 
-FigTp=Figure|GraphicsLayoutWidget
-AxisTp=Axes|AxisItem
+	FigTp=Figure|GraphicsLayoutWidget
+	AxisTp=Axes|AxisItem
 
 class Backend(Protocol):
 	fig:FigTp
 	axes:list
+	# whether plotted curves are reduced to the screen resolution by the backend itself,
+	# so arrays can be given whole rather than decimated first
+	downsamples:bool
 	tighten:bool
 	log_axis:int
-	def __init__(self,title:str=""):
+	def __init__(self,title:str="",headless:bool=False,figsize=None,dpi=None):
 		"""
 		Sets up the figure, creates and shows it if required.
 
@@ -22,6 +29,12 @@ class Backend(Protocol):
 		----------
 		title:str
 			The title of the window to show
+		headless:bool
+			Never show the figure, it's only going to be saved
+		figsize
+			(width,height) in inches, the backend's default if None
+		dpi
+			The resolution, the backend's default if None
 		"""
 		...
 	
@@ -47,6 +60,241 @@ class Backend(Protocol):
 		"""
 		...
 
+	def plot_many(self,x:Iterable,Y:Iterable,colors=None,cmap=None,**kwargs):
+		"""
+		Plot every row of the 2-D array Y as its own trace, as a single artist where the
+		backend allows it, rather than one per row.
+
+		Parameters
+		----------
+		x:Iterable
+			The x data, either shared by all the rows or the same shape as Y
+		Y:Iterable
+			The traces, one per row
+		colors
+			A color for every row, or one color for all of them
+		cmap
+			The name of a colormap to color the rows by their index
+		"""
+		...
+
+	def envelope(self,x:Iterable,lo:Iterable,hi:Iterable,mean:Iterable|None=None,artists=None,alpha:float=0.3,**kwargs):
+		"""
+		Draw the envelope of a trace: the band between lo and hi, and the mean on top
+		of it in the same color if it's given.
+
+		Parameters
+		----------
+		x:Iterable
+			The x of every bin
+		lo:Iterable
+		hi:Iterable
+			The min and max of every bin
+		mean:Iterable|None
+			The mean of every bin, or None for just the band
+		artists
+			What an earlier call returned, to redraw those with the new data rather
+			than draw another envelope
+		alpha:float
+			The opacity of the band
+
+		Return
+		------
+		Whatever has to be passed back as `artists` to update this envelope
+		"""
+		...
+
+	def density(self,counts:np.ndarray,extent:tuple,cmap:str="viridis",**kwargs):
+		"""
+		Draw a 2-D histogram, such as an eye diagram, as an image with a log color scale.
+
+		Parameters
+		----------
+		counts:np.ndarray
+			The counts, indexed [row,column], row 0 at the bottom
+		extent:tuple
+			(left,right,bottom,top) of the grid in data units
+		cmap:str
+			The name of the colormap
+		"""
+		...
+
+	def stream(self,name:str,y:Iterable,x:Iterable|None=None,/,
+			capacity:int=1_000_000,
+			dt:float=1.0,
+			refresh:bool=True,
+			**kwargs):
+		"""
+		Append a chunk of samples to a named trace that keeps at most `capacity` samples.
+		The trace is created on the first call and updated in place after that, rather
+		than adding a new line every time.
+
+		Parameters
+		----------
+		name:str
+			The trace to append to
+		y:Iterable
+			The new samples
+		x:Iterable|None
+			The x of the new samples. If None, counts on from the last x in steps of dt
+		capacity:int
+			The number of samples to keep, only used when the trace is created
+		dt:float
+			The sample spacing used when x is None
+		refresh:bool
+			Whether to redraw after appending
+		"""
+		...
+
+	def clear_stream(self,name:str):
+		"""
+		Empty a streamed trace without removing it
+		"""
+		...
+
+	def track(self,line,src,method:str|None=None) -> None:
+		"""
+		Keep the full resolution Source `src` behind the decimated `line`, and redraw the
+		line from it at the resolution of the view whenever the x limits change,
+		reducing it with `method` (see Source.read)
+		"""
+		...
+
+	def rezoom(self,ax=None) -> None:
+		"""
+		Re-decimate the tracked lines of `ax`, or of every axis, for the current limits
+		now, rather than waiting for the view to settle
+		"""
+		...
+
+	def describe(self) -> dict:
+		"""
+		What's drawn, for exporters that draw the figure themselves (see html.export_html)
+
+		Return
+		------
+		dict
+			`title`, `width` and `height` (pixels) of the figure, and `axes`, a dict per
+			axis of `title`, `xlabel`, `ylabel`, `xlog`, `ylog`, `xlim`, `ylim`, `legend`
+			and `lines`: a dict per line of its `source` (a Source with the full
+			resolution data), `label`, `color` (hex), `width` and `style`
+		"""
+		...
+
+	def legend(self,**kwargs):
+		"""
+		Add a legend to the current axis
+		"""
+		...
+
+	def draw(self) -> None:
+		"""
+		Redraw this figure (and only this figure) if it's on screen
+		"""
+		...
+
+	def flush_events(self) -> None:
+		"""
+		Handle the GUI events waiting, so a redraw asked for by draw happens now
+		rather than whenever the event loop next runs
+		"""
+		...
+
+	def show(self) -> None:
+		"""
+		Show the figure and block until its window is closed
+		"""
+		...
+
+	def save(self,pth:str,dpi:float|None=None) -> None:
+		"""
+		Write the figure to pth, in the format its extension says
+
+		Parameters
+		----------
+		pth:str
+			The file to write, its directory has to exist
+		dpi:float|None
+			The resolution for raster output, the figure's own if None
+		"""
+		...
+
+	def tight_layout(self) -> None:
+		"""
+		Shrink the margins to fit the labels, before saving
+		"""
+		...
+
+	@property
+	def style(self) -> tuple:
+		"""
+		Everything besides the plotted data that changes how the saved figure looks
+		(size, resolution, global style settings), for the output cache
+		"""
+		...
+
+	def grid(self,visible:bool=True) -> None:
+		"""
+		Show or hide the grid on every axis
+		"""
+		...
+
+	def autoscale(self,enable:bool=True,tight:bool=False) -> None:
+		"""
+		Turn y autoscaling of the current axis on or off
+		"""
+		...
+
+	def set_xlim(self,left:float,right:float) -> None:
+		"""
+		Set the x limits of the current axis, in data units even on a log scale
+		"""
+		...
+
+	def set_ylim(self,bot:float,top:float,ax:int|None=None) -> None:
+		"""
+		Set the y limits of axis `ax`, the current one if None
+		"""
+		...
+
+	def get_xlim(self,ax:int|None=None) -> tuple[float,float]:
+		"""
+		The x limits of axis `ax`, the current one if None
+		"""
+		...
+
+	def get_ylim(self,ax:int|None=None) -> tuple[float,float]:
+		"""
+		The y limits of axis `ax`, the current one if None
+		"""
+		...
+
+	def set_xlabel(self,label:str,ax:int|None=None,**kwargs) -> None:
+		"""
+		Label the x axis of axis `ax`, the current one if None. kwargs are font
+		properties, where the backend supports them
+		"""
+		...
+
+	def set_ylabel(self,label:str,ax:int|None=None,**kwargs) -> None:
+		"""
+		Label the y axis of axis `ax`, the current one if None
+		"""
+		...
+
+	def sharex(self,axis) -> None:
+		"""
+		Link the x axis of the current axis to `axis`, so they zoom together
+		"""
+		...
+
+	def axline(self,loc:float,axis:str="x"):
+		"""
+		Draw a dashed line across the current axis, vertical at x=loc if axis is "x",
+		otherwise horizontal at y=loc
+		"""
+		...
+
 	def create_axes(self,num_x:int,num_y:int, index:int=1):
 		"""
 		Make the given number of subplots within this figure
@@ -142,6 +390,13 @@ class Backend(Protocol):
 		# 	raise IndexError("Requested an axis that is outside the scope of current axes. Please call add_subplot first next time!")
 		# self._axis=axis_num
 
+	def close(self):
+		"""
+		Release the figure (close its window, or return it to wherever it came from).
+		The backend can't be used after this.
+		"""
+		...
+
 	def __del__(self):
 		"""
 
@@ -151,6 +406,14 @@ class Backend(Protocol):
 		# 	del axis
 		# del self.fig
 
+	@property
+	def pixel_width(self) -> int:
+		"""
+		The width of the current axis in pixels, used to decide how far traces can be
+		decimated without it being visible.
+		"""
+		...
+
 	@property
 	def num_subfigs(self):
 		"""
@@ -0,0 +1,108 @@
+"""
+Saving figures in the background, so the script can get on with the next thing
+"""
+
+import atexit
+import os
+import pickle
+import sys
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait
+from typing import Callable
+
+__all__=['submit','gather','flush','MODES']
+
+MODES=("thread","process")
+_executors:dict={}
+_pending:set[Future]=set()
+_lock=threading.Lock()
+
+def _init_process():
+	import matplotlib
+	matplotlib.use("Agg")
+
+def _executor(mode:str):
+	if mode not in MODES:
+		raise ValueError(f"background saving should be one of {MODES}, got '{mode}'")
+	with _lock:
+		if mode not in _executors:
+			if mode=="thread":
+				_executors[mode]=ThreadPoolExecutor(max_workers=min(4,os.cpu_count() or 1),thread_name_prefix="plotting-save")
+			else:
+				_executors[mode]=ProcessPoolExecutor(initializer=_init_process)
+		return _executors[mode]
+
+def _done(fut:Future):
+	with _lock:
+		_pending.discard(fut)
+
+def submit(mode:str,fn:Callable,*args,**kwargs) -> Future:
+	"""Run fn on the thread or process pool, keeping the future until flush()"""
+	fut=_executor(mode).submit(fn,*args,**kwargs)
+	with _lock:
+		_pending.add(fut)
+	fut.add_done_callback(_done)
+	return fut
+
+def done(result=None) -> Future:
+	"""A future that's already finished, for when there was nothing to do"""
+	fut=Future()
+	fut.set_result(result)
+	return fut
+
+def flush(timeout:float|None=None) -> None:
+	"""
+	Wait for every background save to finish, raising the error of the first one that
+	failed (the rest are printed).
+	"""
+	with _lock:
+		pending=list(_pending)
+	wait(pending,timeout=timeout)
+	errors=[f.exception() for f in pending if f.done() and f.exception() is not None]
+	for e in errors[1:]:
+		traceback.print_exception(e,file=sys.stderr)
+	if errors:
+		raise errors[0] #pyright:ignore
+
+def gather(futures:list[Future]) -> Future:
+	"""A future that's done once all of futures are, with the first error if any failed"""
+	out=Future()
+	left=[len(futures)]
+	def one_done(_):
+		with _lock:
+			left[0]-=1
+			if left[0]:
+				return
+		errors=[f.exception() for f in futures if f.exception() is not None]
+		if errors:
+			out.set_exception(errors[0])
+		else:
+			out.set_result([f.result() for f in futures])
+	for f in futures:
+		f.add_done_callback(one_done)
+	return out
+
+def save_pickled(data:bytes,tighten:bool,pth:str,*save_args):
+	"""Save a pickled matplotlib Figure, in a worker process"""
+	from matplotlib.backends.backend_agg import FigureCanvasAgg
+	from .mpl import MPL_fig
+	from . import fig_saver
+	from matplotlib import pyplot as plt
+	# a figure pickled from pyplot registers itself with this process's pyplot as it's
+	# loaded, and the worker lives on to save the next one
+	fig=pickle.loads(data)
+	try:
+		FigureCanvasAgg(fig)
+		wrapped=MPL_fig(headless=True,fig=fig)
+		wrapped.tighten=tighten
+		fig_saver(wrapped).save(pth,*save_args)
+	finally:
+		plt.close(fig)
+
+@atexit.register
+def _flush_at_exit():
+	try:
+		flush()
+	except Exception:
+		traceback.print_exc()
@@ -0,0 +1,113 @@
+"""
+Render many figures to files in parallel, one figure_wrapper per job, across a process pool
+"""
+
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Iterable, NamedTuple
+from .spec import FigureSpec
+
+__all__=['FigureJob','JobResult','render_batch']
+
+class FigureJob:
+	"""
+	Everything needed to build and save one figure in another process.
+
+	Calls made on the job are recorded rather than run, and replayed on a fresh
+	figure_wrapper in the worker, so it reads the same as the serial code:
+
+		job=FigureJob("out/trace.png")
+		job.plot(x,y,name="trace")
+		job.set_labels("time (s)","V")
+
+	Alternatively pass `build`, a module-level function that takes the figure_wrapper
+	(plus `args`) and makes the plot itself. Everything in the job has to be picklable.
+	"""
+	outfile:str
+	calls:list
+	build:Callable|None
+	args:tuple
+	tighten:bool
+	def __init__(self,outfile:str,build:Callable|None=None,args:tuple=(),tighten:bool=True,**wrapper_args):
+		self.outfile=outfile
+		self.calls=[]
+		self.build=build
+		self.args=args
+		self.tighten=tighten
+		self.wrapper_args=wrapper_args
+
+	def __getattr__(self,name:str):
+		if name.startswith('_'):
+			raise AttributeError(name)
+		def record(*args,**kwargs):
+			self.calls.append((name,args,kwargs))
+			return self
+		return record
+
+class JobResult(NamedTuple):
+	outfile:str
+	seconds:float
+	error:str|None
+
+	@property
+	def ok(self) -> bool:
+		return self.error is None
+
+def _init_worker():
+	import matplotlib
+	matplotlib.use("Agg")
+
+def _render(job:FigureJob) -> JobResult:
+	from . import figure_wrapper
+	start=time.perf_counter()
+	error=None
+	fw=None
+	try:
+		fw=figure_wrapper(tighten=job.tighten,**({'headless':True}|job.wrapper_args))
+		# never prompt or show from a worker, whatever the parent process looked like
+		fw.wait_save=False
+		fw.show_at_end=False
+		if job.build is not None:
+			job.build(fw,*job.args)
+		FigureSpec(calls=job.calls).replay(fw)
+		fw.outfile=job.outfile
+		fw.__exit__(None,None,None)
+	except Exception:
+		error=traceback.format_exc()
+	finally:
+		if fw is not None:
+			fw.close()
+	return JobResult(job.outfile,time.perf_counter()-start,error)
+
+def render_batch(jobs:Iterable[FigureJob],max_workers:int|None=None,mp_context=None) -> list[JobResult]:
+	"""
+	Render the jobs with the Agg backend across a pool of processes.
+
+	Parameters
+	----------
+	jobs:Iterable[FigureJob]
+		The figures to make
+	max_workers:int|None
+		The number of processes, defaults to the number of CPUs
+	mp_context
+		The multiprocessing context for the pool, e.g. multiprocessing.get_context("spawn")
+		if the parent has already started a GUI toolkit.
+
+	Return
+	------
+	list[JobResult]
+		One result per job, in the order given. A job that raised, or whose worker
+		died, has the traceback in `error`; the other jobs still run.
+	"""
+	jobs=list(jobs)
+	results:list[JobResult|None]=[None]*len(jobs)
+	with ProcessPoolExecutor(max_workers=max_workers,mp_context=mp_context,initializer=_init_worker) as pool:
+		futures={pool.submit(_render,job):i for i,job in enumerate(jobs)}
+		for fut in as_completed(futures):
+			i=futures[fut]
+			try:
+				results[i]=fut.result()
+			except Exception:
+				results[i]=JobResult(jobs[i].outfile,0.0,traceback.format_exc())
+	return results #pyright:ignore
@@ -0,0 +1,233 @@
+"""
+Benchmarks for the plotting pipeline.
+
+Run with
+
+	python -m plotting.bench [--sizes 1e3 1e5 1e7] [--cases plot save.png] [--save base.json] [--compare base.json]
+
+Everything is rendered headless with Agg, so it runs anywhere. Each case is timed (best
+of --repeat runs) and then run once more under tracemalloc for the peak memory, which
+numpy's allocations are counted in. --save stores the results as a baseline and
+--compare reports each case against one, flagging anything slower than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from typing import Callable
+
+__all__=['CASES','run','compare']
+
+SIZES=(1e3,1e4,1e5,1e6)
+CASES:dict[str,Callable[[int,str],Callable[[],object]]]={}
+
+def case(name:str):
+	"""
+	Register a benchmark. The function gets the number of points and a scratch
+	directory, does its setup, and returns the zero-argument callable to time.
+	"""
+	def register(f):
+		CASES[name]=f
+		return f
+	return register
+
+def _data(n:int):
+	x=np.linspace(1,1e6,n)
+	return x,np.sin(x/1e3)+1.5
+
+def _render(fw):
+	fw.fig.fig.canvas.draw()
+	fw.close()
+
+def _traced(method:str):
+	def setup(n,_):
+		from . import figure_wrapper
+		x,y=_data(n)
+		def run():
+			fw=figure_wrapper(headless=True)
+			getattr(fw,method)(x,y)
+			_render(fw)
+		return run
+	return setup
+
+case("plot")(_traced("plot"))
+case("slogx")(_traced("slogx"))
+case("loglog")(_traced("loglog"))
+
+@case("plot.decimated")
+def _decimated(n,_):
+	from . import figure_wrapper
+	x,y=_data(n)
+	def run():
+		fw=figure_wrapper(headless=True,decimate="minmax")
+		fw.plot(x,y)
+		_render(fw)
+	return run
+
+@case("plot2")
+def _plot2(n,_):
+	from . import figure_wrapper
+	x,y=_data(n)
+	def run():
+		fw=figure_wrapper(headless=True)
+		fw.plot2(x,y,-y)
+		_render(fw)
+	return run
+
+@case("pd")
+def _pd(n,_):
+	import pandas as pd
+	from . import figure_wrapper
+	x,y=_data(n)
+	df=pd.DataFrame({'a':y,'b':-y,'c':2*y,'d':y/2},index=pd.Index(x,name="f"))
+	def run():
+		fw=figure_wrapper(headless=True)
+		fw.pd(figure_wrapper.plot,df)
+		_render(fw)
+	return run
+
+@case("pfunc")
+def _pfunc(n,_):
+	from . import figure_wrapper
+	x,_y=_data(n)
+	def run():
+		fw=figure_wrapper(headless=True)
+		fw.pfunc(x,lambda f:1/np.sqrt(1+(f/1e3)**2))
+		_render(fw)
+	return run
+
+@case("density")
+def _density(n,_):
+	from . import figure_wrapper
+	x,y=_data(n)
+	def run():
+		fw=figure_wrapper(headless=True)
+		fw.density(y,x,period=2e3*np.pi)
+		_render(fw)
+	return run
+
+@case("spectrum")
+def _spectrum(n,_):
+	from . import figure_wrapper
+	_,y=_data(n)
+	def run():
+		fw=figure_wrapper(headless=True)
+		fw.spectrum(y,nperseg=min(65536,len(y)),parallel="thread")
+		_render(fw)
+	return run
+
+def _save(fmt:str):
+	def setup(n,tmp):
+		from . import figure_wrapper, fig_saver
+		x,y=_data(n)
+		out=os.path.join(tmp,f"bench.{fmt}")
+		def run():
+			fw=figure_wrapper(headless=True)
+			fw.plot(x,y)
+			fig_saver(fw.fig).save(out)
+			fw.close()
+		return run
+	return setup
+
+for _fmt in ("png","pdf","svg"):
+	case(f"save.{_fmt}")(_save(_fmt))
+
+@case("pqg.plot")
+def _pqg(n,_):
+	os.environ.setdefault("QT_QPA_PLATFORM","offscreen")
+	from .pqg import PQG_fig
+	x,y=_data(n)
+	def run():
+		fig=PQG_fig()
+		fig.plot(x,y)
+		fig.draw()
+		fig.close()
+	return run
+
+def _measure(run:Callable,repeat:int) -> dict:
+	best=float('inf')
+	for _ in range(repeat):
+		start=time.perf_counter()
+		run()
+		best=min(best,time.perf_counter()-start)
+	tracemalloc.start()
+	try:
+		run()
+		_,peak=tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return {'seconds':best,'peak_mb':peak/2**20}
+
+def run(cases=None,sizes=SIZES,repeat:int=3,log=print) -> dict:
+	"""
+	Run the benchmarks, returning {"case@n": {"seconds":..,"peak_mb":..}}. Cases
+	whose dependencies aren't installed are skipped.
+	"""
+	results={}
+	# fig_saver prints every save
+	with tempfile.TemporaryDirectory() as tmp, open(os.devnull,'w') as quiet:
+		for name in cases or CASES:
+			for n in sizes:
+				key=f"{name}@{int(n):.0e}"
+				try:
+					bench=CASES[name](int(n),tmp)
+				except ImportError as e:
+					log(f"{key:24} skipped ({e.name} not installed)")
+					break
+				stdout,sys.stdout=sys.stdout,quiet
+				try:
+					res=_measure(bench,repeat)
+				finally:
+					sys.stdout=stdout
+				results[key]=res
+				log(f"{key:24} {res['seconds']*1e3:10.1f} ms {res['peak_mb']:10.1f} MB")
+	return results
+
+def compare(results:dict,baseline:dict,tolerance:float=0.1,log=print) -> list[str]:
+	"""
+	Report every case against the baseline, returning the ones that got slower by more
+	than `tolerance` (a fraction).
+	"""
+	slower=[]
+	for key,res in results.items():
+		if key not in baseline:
+			continue
+		ratio=res['seconds']/baseline[key]['seconds']
+		mem=res['peak_mb']-baseline[key]['peak_mb']
+		flag=""
+		if ratio > 1+tolerance:
+			flag="  SLOWER"
+			slower.append(key)
+		log(f"{key:24} {ratio:6.2f}x time {mem:+10.1f} MB{flag}")
+	return slower
+
+def main(argv=None):
+	parser=argparse.ArgumentParser(prog="python -m plotting.bench",description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--cases",nargs="+",choices=sorted(CASES),help="the cases to run, default all")
+	parser.add_argument("--sizes",nargs="+",type=float,default=SIZES,help="numbers of points, e.g. 1e3 1e8")
+	parser.add_argument("--repeat",type=int,default=3)
+	parser.add_argument("--save",metavar="FILE",help="store the results as a baseline")
+	parser.add_argument("--compare",metavar="FILE",help="compare against a stored baseline")
+	parser.add_argument("--tolerance",type=float,default=0.1,help="allowed slowdown before flagging, default 0.1")
+	args=parser.parse_args(argv)
+	import matplotlib
+	matplotlib.use("Agg")
+	results=run(args.cases,args.sizes,args.repeat)
+	if args.save:
+		with open(args.save,'w') as f:
+			json.dump(results,f,indent=1)
+	if args.compare:
+		with open(args.compare) as f:
+			baseline=json.load(f)
+		print()
+		if compare(results,baseline,args.tolerance):
+			return 1
+	return 0
+
+if __name__=="__main__":
+	sys.exit(main())
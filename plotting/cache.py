@@ -0,0 +1,138 @@
+"""
+Skipping the render of figures that would come out the same as last time
+"""
+
+import hashlib
+import os
+import shutil
+import types
+import numpy as np
+from os import path
+
+__all__=['fingerprint','OutputCache']
+
+def fingerprint(obj,h) -> None:
+	"""
+	Feed everything about obj that affects a plot into the hash h. Arrays are hashed by
+	content, pandas objects through their values and index, Sources by what they read
+	from and functions by their code; anything else by its repr.
+	"""
+	from .sources import Source
+	if isinstance(obj,np.ndarray):
+		h.update(f"nd{obj.dtype.str}{obj.shape}".encode())
+		h.update(memoryview(np.ascontiguousarray(obj)).cast('B'))
+	elif isinstance(obj,(list,tuple)):
+		h.update(f"{type(obj).__name__}{len(obj)}(".encode())
+		for item in obj:
+			fingerprint(item,h)
+		h.update(b")")
+	elif isinstance(obj,dict):
+		h.update(f"dict{len(obj)}(".encode())
+		for k in sorted(obj,key=repr):
+			fingerprint(k,h)
+			fingerprint(obj[k],h)
+		h.update(b")")
+	elif isinstance(obj,Source):
+		fingerprint(obj.fingerprint(),h)
+	elif hasattr(obj,"to_numpy") and hasattr(obj,"index"):
+		# a pandas Series or DataFrame
+		h.update(repr((type(obj).__name__,getattr(obj,"name",None),list(getattr(obj,"columns",[])))).encode())
+		fingerprint(obj.index.to_numpy(),h)
+		if hasattr(obj,"columns"):
+			# a column at a time, as views: the whole frame as one array is a copy of it
+			for i in range(obj.shape[1]):
+				fingerprint(obj.iloc[:,i].to_numpy(),h)
+		else:
+			fingerprint(obj.to_numpy(),h)
+	elif isinstance(obj,types.CodeType):
+		h.update(obj.co_code)
+		fingerprint(obj.co_consts,h)
+		fingerprint(obj.co_names,h)
+	elif hasattr(obj,"__code__"):
+		h.update(f"fn{obj.__module__}.{obj.__qualname__}".encode())
+		fingerprint(obj.__code__,h)
+		fingerprint(getattr(obj,"__defaults__",None),h)
+		cells=getattr(obj,"__closure__",None) or ()
+		fingerprint([c.cell_contents for c in cells],h)
+	elif hasattr(obj,"__array__") and not isinstance(obj,(str,bytes)):
+		fingerprint(np.asarray(obj),h)
+	else:
+		h.update(repr(obj).encode())
+
+class OutputCache:
+	"""
+	Remembers the key of the figure each output file was rendered from.
+
+	Every save writes the key to a hidden file next to the output (`.name.png.key`);
+	when the output exists and its key matches, the save is skipped. With `dir` the
+	outputs are also kept there by key, so a figure that was rendered before, to any
+	path, is copied rather than rendered again. That store is trimmed back to
+	`max_bytes`, least recently used first.
+	"""
+	dir:str|None
+	max_bytes:int
+	def __init__(self,dir:str|None=None,max_bytes:int=1<<30):
+		self.dir=dir
+		self.max_bytes=max_bytes
+		if dir is not None:
+			os.makedirs(dir,exist_ok=True)
+
+	@staticmethod
+	def _sidecar(pth:str) -> str:
+		head,tail=path.split(pth)
+		return path.join(head,f".{tail}.key")
+
+	def _stored(self,key:str,pth:str) -> str:
+		return path.join(self.dir,key+path.splitext(pth)[1]) #pyright:ignore
+
+	def fetch(self,key:str,pth:str) -> bool:
+		"""Make sure pth holds the output for key, returning False if it has to be rendered"""
+		sidecar=self._sidecar(pth)
+		if path.exists(pth) and path.exists(sidecar):
+			with open(sidecar) as f:
+				if f.read()==key:
+					return True
+		if self.dir is None:
+			return False
+		stored=self._stored(key,pth)
+		if not path.exists(stored):
+			return False
+		os.utime(stored)
+		os.makedirs(path.dirname(pth) or ".",exist_ok=True)
+		shutil.copyfile(stored,pth)
+		self._write_sidecar(key,pth)
+		return True
+
+	def _write_sidecar(self,key:str,pth:str):
+		with open(self._sidecar(pth),'w') as f:
+			f.write(key)
+
+	def store(self,key:str,pth:str):
+		"""Record that pth was just rendered for key"""
+		self._write_sidecar(key,pth)
+		if self.dir is None:
+			return
+		stored=self._stored(key,pth)
+		tmp=f"{stored}.{os.getpid()}.tmp"
+		shutil.copyfile(pth,tmp)
+		os.replace(tmp,stored)
+		self.evict()
+
+	def evict(self):
+		"""Delete the least recently used outputs until the store fits in max_bytes"""
+		if self.dir is None:
+			return
+		entries=[]
+		for e in os.scandir(self.dir):
+			if e.is_file() and not e.name.endswith(".tmp"):
+				st=e.stat()
+				entries.append((st.st_mtime,st.st_size,e.path))
+		total=sum(size for _,size,_ in entries)
+		for _,size,pth in sorted(entries):
+			if total <= self.max_bytes:
+				break
+			os.remove(pth)
+			total-=size
+
+def new_hash():
+	return hashlib.blake2b(digest_size=20)
@@ -0,0 +1,207 @@
+"""
+Data reduction for traces that are much longer than the axis is wide
+"""
+
+import numpy as np
+from typing import Iterable
+
+__all__=['minmax','minmax_indices','logminmax','logminmax_indices','lttb','decimate','METHODS']
+
+METHODS=("minmax","lttb","log")
+# used when the backend can't tell us how wide the axis is
+DEFAULT_WIDTH=1920
+
+def minmax(x:Iterable,y:Iterable,n_bins:int) -> tuple[np.ndarray,np.ndarray]:
+	"""
+	Reduce the trace to the min and max of each of `n_bins` equal-count bins.
+
+	The points are kept in their original order, so a line drawn through them traces
+	out the same envelope as the full data when there is one bin per pixel column.
+	The first and last points are always kept so the x extent doesn't change.
+
+	Parameters
+	----------
+	x:Iterable
+		The x data, assumed to be monotonic
+	y:Iterable
+		The y data, same length as x
+	n_bins:int
+		The number of bins to reduce to, usually the width of the axis in pixels
+
+	Return
+	------
+	tuple[np.ndarray,np.ndarray]
+		The reduced x and y, at most 2*n_bins+2 points long
+	"""
+	x=np.asarray(x)
+	y=np.asarray(y)
+	if n_bins < 1 or len(y) <= 2*n_bins+2:
+		return x,y
+	keep=minmax_indices(y,n_bins)
+	return x[keep],y[keep]
+
+def minmax_indices(y:np.ndarray,n_bins:int) -> np.ndarray:
+	"""
+	The sorted indices of the points minmax keeps, for when x isn't in memory
+	"""
+	n=len(y)
+	if n_bins < 1 or n <= 2*n_bins+2:
+		return np.arange(n)
+	per_bin=n//n_bins
+	full=y[:per_bin*n_bins].reshape(n_bins,per_bin)
+	offsets=np.arange(n_bins)*per_bin
+	lo=full.argmin(axis=1)+offsets
+	hi=full.argmax(axis=1)+offsets
+	idx=[[0],np.minimum(lo,hi),np.maximum(lo,hi)]
+	if per_bin*n_bins < n:
+		tail=y[per_bin*n_bins:]
+		start=per_bin*n_bins
+		idx.append([start+tail.argmin(),start+tail.argmax()])
+	idx.append([n-1])
+	return np.unique(np.concatenate(idx))
+
+def logminmax(x:Iterable,y:Iterable,n_bins:int) -> tuple[np.ndarray,np.ndarray]:
+	"""
+	minmax with bins of equal width in log(x) rather than equal count, for traces
+	drawn on a log x axis.
+
+	A sweep with linearly spaced x puts nearly all its points in the last decade,
+	where equal-count bins would still leave thousands of points per pixel column
+	while the first decades get squeezed into a few bins. Log-spaced bins match the
+	pixel columns of a log axis instead; bins with only a couple of points keep them
+	all. Points at x <= 0, which a log axis can't show, are dropped once there's
+	anything to reduce.
+
+	Parameters
+	----------
+	x:Iterable
+		The x data, assumed to be increasing
+	y:Iterable
+		The y data, same length as x
+	n_bins:int
+		The number of bins to reduce to, usually the width of the axis in pixels
+
+	Return
+	------
+	tuple[np.ndarray,np.ndarray]
+		The reduced x and y, at most 2*n_bins+2 points long
+	"""
+	x=np.asarray(x)
+	y=np.asarray(y)
+	keep=logminmax_indices(x,y,n_bins)
+	if len(keep)==len(y):
+		return x,y
+	return x[keep],y[keep]
+
+def logminmax_indices(x:np.ndarray,y:np.ndarray,n_bins:int,span:tuple[float,float]|None=None) -> np.ndarray:
+	"""
+	The sorted indices of the points logminmax keeps. The bins run across `span`,
+	the positive x of the whole trace, so it can be reduced a chunk at a time; by
+	default that's the span of x.
+	"""
+	n=len(y)
+	first=int(np.searchsorted(x,0,side='right'))
+	if n_bins < 1 or n <= 2*n_bins+2:
+		return np.arange(n)
+	if n-first <= 2*n_bins+2:
+		return np.arange(first,n)
+	xs=x[first:].astype(float,copy=False)
+	ys=y[first:]
+	edges=np.geomspace(*(span or (xs[0],xs[-1])),n_bins+1)
+	# a chunk starts part way through a bin, and may end before the last ones
+	starts=np.unique(np.concatenate([[0],np.searchsorted(xs,edges[:-1],side='left')]))
+	starts=starts[starts < len(xs)]
+	ends=np.append(starts[1:],len(xs))
+	# the min and max of every bin, then the first point in it equal to each; a bin
+	# of NaNs has none, and gives its first point instead
+	reps=ends-starts
+	def first_equal(vals):
+		hits=np.flatnonzero(ys==np.repeat(vals,reps))
+		i=hits[np.minimum(np.searchsorted(hits,starts),len(hits)-1)] if len(hits) else starts
+		return np.where((i>=starts)&(i<ends),i,starts)
+	lo=first_equal(np.fmin.reduceat(ys,starts))
+	hi=first_equal(np.fmax.reduceat(ys,starts))
+	idx=[[first],first+np.minimum(lo,hi),first+np.maximum(lo,hi),[n-1]]
+	return np.unique(np.concatenate(idx))
+
+def lttb(x:Iterable,y:Iterable,n_out:int) -> tuple[np.ndarray,np.ndarray]:
+	"""
+	Largest-Triangle-Three-Buckets downsampling.
+
+	Picks one point per bucket, whichever makes the largest triangle with the point
+	picked from the previous bucket and the mean of the next one. This keeps the shape
+	of the trace better than min/max for smooth data, at the cost of a loop over the
+	buckets (each bucket is still handled as a whole array).
+
+	Parameters
+	----------
+	x:Iterable
+		The x data
+	y:Iterable
+		The y data, same length as x
+	n_out:int
+		The number of points to return, including the first and last
+
+	Return
+	------
+	tuple[np.ndarray,np.ndarray]
+		The reduced x and y, n_out points long
+	"""
+	x=np.asarray(x)
+	y=np.asarray(y)
+	n=len(y)
+	if n_out < 3 or n <= n_out:
+		return x,y
+	xf=x.astype(float,copy=False)
+	yf=y.astype(float,copy=False)
+	edges=np.linspace(1,n-1,n_out-1).astype(np.intp)
+	keep=np.empty(n_out,dtype=np.intp)
+	keep[0]=0
+	keep[-1]=n-1
+	prev=0
+	for i in range(n_out-2):
+		lo,hi=edges[i],edges[i+1]
+		if i+2 < len(edges):
+			nxt=slice(hi,edges[i+2])
+			nx,ny=xf[nxt].mean(),yf[nxt].mean()
+		else:
+			nx,ny=xf[-1],yf[-1]
+		px,py=xf[prev],yf[prev]
+		area=np.abs((px-nx)*(yf[lo:hi]-py)-(px-xf[lo:hi])*(ny-py))
+		prev=lo+int(area.argmax())
+		keep[i+1]=prev
+	return x[keep],y[keep]
+
+def decimate(x:Iterable,y:Iterable,method:str="minmax",width:int=DEFAULT_WIDTH):
+	"""
+	Reduce a trace so that it has about as many points as `width` pixels can show.
+
+	Parameters
+	----------
+	x:Iterable
+		The x data
+	y:Iterable
+		The y data
+	method:str
+		One of "minmax", "lttb" or "log" (see logminmax)
+	width:int
+		The width of the axis in pixels
+
+	Return
+	------
+	tuple[np.ndarray,np.ndarray]
+		The reduced data. If the data is already small enough, or isn't 1-D, it's
+		returned untouched.
+	"""
+	if method not in METHODS:
+		raise ValueError(f"Unknown decimation method '{method}', expected one of {METHODS}")
+	xa=np.asarray(x)
+	ya=np.asarray(y)
+	if ya.ndim != 1 or xa.shape != ya.shape:
+		return x,y
+	# two bins per pixel, since the bin edges won't line up with the pixel edges
+	if method=="lttb":
+		return lttb(xa,ya,4*width)
+	if method=="log":
+		return logminmax(xa,ya,2*width)
+	return minmax(xa,ya,2*width)
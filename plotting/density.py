@@ -0,0 +1,145 @@
+"""
+Folding a long trace into a 2-D histogram, for eye diagrams and other persistence plots
+"""
+
+import numpy as np
+from typing import Iterable
+
+__all__=['EyeHistogram']
+
+def _sample_spacing(x:Iterable,default:float=1.0,n:int=1<<16) -> float:
+	"""the typical step of x, from its first n samples, or default if it has none"""
+	x=np.asarray(x,dtype=float).ravel()[:n]
+	steps=np.diff(x)
+	steps=steps[np.isfinite(steps)&(steps>0)]
+	return float(np.median(steps)) if len(steps) else default
+
+class EyeHistogram:
+	"""
+	Counts how often a trace passes through each cell of a (phase, y) grid, a chunk
+	at a time, so the memory used is the grid plus one chunk however long the trace is.
+
+	Sample t goes in column (t-start+offset) mod span, where start is the x of the
+	last trigger crossing, or 0 without a trigger. With a trigger but no period
+	each segment is only the `span` after its crossing, and anything later than that
+	is dropped until the next crossing.
+
+	Parameters
+	----------
+	yrange:tuple[float,float]
+		The range of y covered by the rows; anything outside is dropped
+	period:float|None
+		The unit interval, in x units. The window is `span` wide, two periods by default
+	span:float|None
+		The width of the window, needed when there is no period
+	trigger:float|None
+		Re-align the window on every rising crossing of this level
+	offset:float
+		Where in the window the start of a period (or the trigger) lands
+	bins:tuple[int,int]
+		The number of columns and rows
+	dt:float
+		The sample spacing, for traces given without x. With x it only sets the default
+		fill, so it should still be about the spacing of x (see _sample_spacing)
+	fill:int|None
+		Linearly interpolate this many points per sample interval, so sparsely sampled
+		edges still draw as lines rather than dots. By default enough that consecutive
+		points are at most a column apart
+	chunk:int
+		The number of points (after filling in) handled at once
+	"""
+	counts:np.ndarray
+	span:float
+	def __init__(self,
+				 yrange:tuple[float,float],
+				 period:float|None=None,
+				 span:float|None=None,
+				 trigger:float|None=None,
+				 offset:float=0.0,
+				 bins:tuple[int,int]=(400,256),
+				 dt:float=1.0,
+				 fill:int|None=None,
+				 chunk:int=1<<16):
+		if period is None and (trigger is None or span is None):
+			raise ValueError("either period, or trigger and span have to be given")
+		self.period=period
+		self.span=float(span if span is not None else 2*period) #pyright:ignore
+		self.trigger=trigger
+		self.offset=offset
+		self.yrange=(float(yrange[0]),float(yrange[1]))
+		self.bins=bins
+		self.dt=dt
+		if fill is None:
+			fill=int(np.ceil(dt*bins[0]/self.span))
+		self.fill=max(int(fill),1)
+		self.chunk=chunk
+		self.clear()
+
+	def clear(self):
+		self.counts=np.zeros(self.bins[::-1],dtype=np.int64)
+		self._n=0
+		# the last sample seen and the last trigger, carried between chunks
+		self._last=(np.nan,np.nan)
+		self._trig=-np.inf
+
+	@property
+	def extent(self) -> tuple[float,float,float,float]:
+		"""(left,right,bottom,top) of the grid, in data units"""
+		return (0.0,self.span,*self.yrange)
+
+	def add(self,y:Iterable,x:Iterable|None=None):
+		"""Count the samples y, at x or carrying on at dt from the previous ones"""
+		y=np.asarray(y,dtype=float).ravel()
+		if x is not None:
+			x=np.asarray(x,dtype=float).ravel()
+		# the chunk is counted after filling in, so the temporaries stay in cache
+		step=max(self.chunk//self.fill,1)
+		for i in range(0,len(y),step):
+			ys=y[i:i+step]
+			if x is None:
+				xs=self.dt*(self._n+np.arange(len(ys)))
+			else:
+				xs=x[i:i+step]
+			self._add(xs,ys)
+			self._n+=len(ys)
+
+	def _add(self,x:np.ndarray,y:np.ndarray):
+		xa=np.concatenate(([self._last[0]],x))
+		ya=np.concatenate(([self._last[1]],y))
+		self._last=(xa[-1],ya[-1])
+		if self.fill > 1:
+			frac=np.arange(1,self.fill+1)/self.fill
+			xs=(xa[:-1,None]+np.diff(xa)[:,None]*frac).ravel()
+			ys=(ya[:-1,None]+np.diff(ya)[:,None]*frac).ravel()
+		else:
+			xs,ys=x,y
+		nx,ny=self.bins
+		lo,hi=self.yrange
+		if self.trigger is None:
+			col=xs+self.offset
+		else:
+			col=xs-self._starts(xa,ya,xs)+self.offset
+		col*=nx/self.span
+		if self.period is not None:
+			# the same as np.mod, which is several times slower. Samples before the
+			# first trigger are at inf, and come out as NaN
+			with np.errstate(invalid='ignore'):
+				col-=nx*np.floor(col/nx)
+		np.floor(col,out=col)
+		row=np.floor((ys-lo)*(ny/(hi-lo)))
+		keep=(col>=0)&(col<nx)&(row>=0)&(row<ny)
+		# everything out of range (or NaN) goes in one extra cell at the end, which is
+		# much cheaper than indexing the good ones out
+		row*=nx
+		row+=col
+		cells=np.where(keep,row,nx*ny).astype(np.intp)
+		self.counts+=np.bincount(cells,minlength=nx*ny+1)[:-1].reshape(ny,nx)
+
+	def _starts(self,xa:np.ndarray,ya:np.ndarray,xs:np.ndarray) -> np.ndarray:
+		"""the x of the last trigger crossing at or before each of xs"""
+		lvl=self.trigger
+		i=np.flatnonzero((ya[:-1]<lvl)&(ya[1:]>=lvl))
+		t=xa[i]+(lvl-ya[i])/(ya[i+1]-ya[i])*(xa[i+1]-xa[i])
+		starts=np.concatenate(([self._trig],t))
+		self._trig=starts[-1]
+		return starts[np.searchsorted(starts,xs,side='right')-1]
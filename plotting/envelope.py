@@ -0,0 +1,99 @@
+"""
+The min/max/mean envelope of a trace that arrives a chunk at a time, of unknown length
+"""
+
+import numpy as np
+from typing import Iterable
+
+__all__=['Envelope']
+
+class Envelope:
+	"""
+	Reduces a trace to between `n_bins` and 2*`n_bins` bins of equal sample count,
+	keeping the min, max, sum and count of each, as chunks of it are added.
+
+	The bins start one sample wide; whenever there are too many, neighbouring pairs
+	are merged and new bins are made twice as wide, so the memory used stays the
+	same however long the trace turns out to be. Each bin is placed at the x of its
+	first sample.
+	"""
+	n_bins:int
+	per_bin:int
+	def __init__(self,n_bins:int=2000):
+		self.n_bins=n_bins
+		self.clear()
+
+	def clear(self):
+		self.per_bin=1
+		self._x=np.empty(0)
+		self._lo=np.empty(0)
+		self._hi=np.empty(0)
+		self._sum=np.empty(0)
+		self._n=np.empty(0,dtype=np.int64)
+		# the samples that don't fill a bin yet
+		self._carry_x=np.empty(0)
+		self._carry_y=np.empty(0)
+		self.count=0
+
+	def __len__(self):
+		return len(self._n)
+
+	def add(self,x:Iterable,y:Iterable):
+		"""Add the next samples of the trace, x has to carry on from the last ones"""
+		x=np.asarray(x)
+		y=np.asarray(y,dtype=float)
+		self.count+=len(y)
+		if len(self._carry_y):
+			x=np.concatenate((self._carry_x,x))
+			y=np.concatenate((self._carry_y,y))
+		while len(self)+len(y)//self.per_bin > 2*self.n_bins:
+			self._halve()
+		full=len(y)//self.per_bin*self.per_bin
+		self._carry_x=x[full:]
+		self._carry_y=y[full:]
+		if full==0:
+			return
+		ys=y[:full].reshape(-1,self.per_bin)
+		# fmin and fmax skip NaNs, without nanmin's warning for a bin of nothing else
+		self._append(x[:full:self.per_bin],np.fmin.reduce(ys,axis=1),np.fmax.reduce(ys,axis=1),
+			   np.nansum(ys,axis=1),np.count_nonzero(~np.isnan(ys),axis=1))
+
+	def _append(self,x,lo,hi,sums,n):
+		if not len(self._x):
+			self._x=self._x.astype(x.dtype)
+		self._x=np.concatenate((self._x,x))
+		self._lo=np.concatenate((self._lo,lo))
+		self._hi=np.concatenate((self._hi,hi))
+		self._sum=np.concatenate((self._sum,sums))
+		self._n=np.concatenate((self._n,n))
+
+	def _halve(self):
+		"""merge neighbouring bins, and make the bins to come twice as wide"""
+		self.per_bin*=2
+		m=len(self)//2*2
+		if m==0:
+			return
+		# an odd bin out at the end stays as it is
+		tail=slice(m,None)
+		pair=lambda a:a[:m].reshape(-1,2)
+		self._x=np.concatenate((self._x[:m:2],self._x[tail]))
+		self._lo=np.concatenate((np.fmin(*pair(self._lo).T),self._lo[tail]))
+		self._hi=np.concatenate((np.fmax(*pair(self._hi).T),self._hi[tail]))
+		self._sum=np.concatenate((pair(self._sum).sum(axis=1),self._sum[tail]))
+		self._n=np.concatenate((pair(self._n).sum(axis=1),self._n[tail]))
+
+	def result(self) -> tuple[np.ndarray,np.ndarray,np.ndarray,np.ndarray]:
+		"""
+		x, min, max and mean of every bin so far, including the part-filled one at
+		the end
+		"""
+		x,lo,hi,sums,n=self._x,self._lo,self._hi,self._sum,self._n
+		if len(self._carry_y):
+			cy=self._carry_y
+			x=np.concatenate((x,self._carry_x[:1]))
+			lo=np.append(lo,np.fmin.reduce(cy))
+			hi=np.append(hi,np.fmax.reduce(cy))
+			sums=np.append(sums,np.nansum(cy))
+			n=np.append(n,np.count_nonzero(~np.isnan(cy)))
+		with np.errstate(invalid='ignore',divide='ignore'):
+			return x,lo,hi,sums/n
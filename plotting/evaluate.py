@@ -0,0 +1,109 @@
+"""
+Evaluating a function over an x grid for figure_wrapper.pfunc
+"""
+
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Iterable
+
+__all__=['evaluate','clear_cache']
+
+CACHE_SIZE=32
+_cache:OrderedDict=OrderedDict()
+_cache_lock=threading.Lock()
+
+def clear_cache():
+	"""forget every result memoized by evaluate"""
+	with _cache_lock:
+		_cache.clear()
+
+def _grid_key(f:Callable,x:np.ndarray):
+	h=hashlib.blake2b(digest_size=16)
+	h.update(str((x.dtype,x.shape)).encode())
+	h.update(memoryview(np.ascontiguousarray(x)).cast('B'))
+	return (f,h.hexdigest())
+
+def _whole(f:Callable,x:np.ndarray):
+	"""f applied to the whole array at once, or None if f can't take an array"""
+	try:
+		y=np.asarray(f(x))
+	except Exception:
+		return None
+	if y.shape != x.shape:
+		return None
+	return y
+
+def _elementwise(f:Callable,chunk:np.ndarray) -> np.ndarray:
+	return np.vectorize(f)(chunk)
+
+def _pool(parallel:str,workers:int|None) -> Executor:
+	if parallel=="thread":
+		return ThreadPoolExecutor(max_workers=workers)
+	if parallel=="process":
+		return ProcessPoolExecutor(max_workers=workers)
+	raise ValueError(f"parallel should be 'thread' or 'process', got '{parallel}'")
+
+def evaluate(f:Callable,
+			 x:Iterable,
+			 chunksize:int=1<<16,
+			 parallel:str="",
+			 workers:int|None=None,
+			 cache:bool=False) -> np.ndarray:
+	"""
+	Evaluate f at every point of x, as fast as f allows.
+
+	f is first called on the whole array, which is all it takes for anything written
+	with numpy operations. If that raises, or doesn't give one value per point, f is
+	applied element by element, `chunksize` points at a time, optionally spread over
+	a pool. Note f may therefore be called once on the whole array before falling back.
+
+	Parameters
+	----------
+	f:Callable
+		The function to evaluate
+	x:Iterable
+		The points to evaluate it at
+	chunksize:int
+		The number of points per chunk when evaluating element by element
+	parallel:str
+		"" to evaluate the chunks in this thread, "thread" for a thread pool (good
+		when f releases the GIL), "process" for a process pool (pure python f, which
+		then has to be picklable)
+	workers:int|None
+		The size of the pool, defaults to what concurrent.futures picks
+	cache:bool
+		Remember the result, keyed on f and the contents of x, so evaluating the same
+		function on the same grid again costs a hash of x. The cached array is returned
+		as-is, so don't modify it in place.
+
+	Return
+	------
+	np.ndarray
+		f(x), the same shape as x
+	"""
+	x=np.asarray(x)
+	if cache:
+		key=_grid_key(f,x)
+		with _cache_lock:
+			if key in _cache:
+				_cache.move_to_end(key)
+				return _cache[key]
+	y=_whole(f,x)
+	if y is None:
+		flat=x.ravel()
+		chunks=[flat[i:i+chunksize] for i in range(0,len(flat),chunksize)]
+		if parallel and len(chunks) > 1:
+			with _pool(parallel,workers) as pool:
+				parts=list(pool.map(_elementwise,[f]*len(chunks),chunks))
+		else:
+			parts=[_elementwise(f,c) for c in chunks]
+		y=np.concatenate(parts).reshape(x.shape) if parts else np.empty(x.shape)
+	if cache:
+		with _cache_lock:
+			_cache[key]=y
+			while len(_cache) > CACHE_SIZE:
+				_cache.popitem(last=False)
+	return y
@@ -0,0 +1,357 @@
+"""
+Exporting a figure as a single HTML file that can be zoomed and panned offline
+"""
+
+import base64
+import json
+import zlib
+import numpy as np
+from typing import TYPE_CHECKING
+from .sources import Source
+if TYPE_CHECKING:
+	from .backend import Backend
+
+__all__=['export_html','pyramid','FORMATS']
+
+FORMATS={'html','htm'}
+
+def pyramid(src:Source,max_points:int=1<<21,min_bins:int=1024) -> dict:
+	"""
+	The min/max envelope of src at every resolution from the finest to the coarsest,
+	each level with bins twice as wide as the one before.
+
+	The finest level is the samples themselves if there are no more than
+	`max_points` of them, otherwise bins just wide enough (a power of two of samples)
+	that there are at most that many. Levels stop once one has `min_bins` bins or
+	fewer. src is read a chunk at a time, so only the finest level has to fit in
+	memory.
+
+	Return
+	------
+	dict
+		`n`, the number of samples; `x0` and `dt` if they're evenly spaced; and
+		`levels`, a list of dicts of `w` (samples per bin), `lo` and `hi` (hi is None
+		at one sample per bin) and `x` (the x of each bin's first sample, or None if
+		the samples are evenly spaced)
+	"""
+	n=len(src)
+	w=1
+	while n > w*max_points:
+		w*=2
+	uniform=_spacing(src)
+	step=max(src.chunk//w,1)*w
+	los,his,xs=[],[],[]
+	for i in range(0,n,step):
+		y=np.asarray(src.y(i,min(i+step,n)),dtype=np.float32)
+		if uniform is None:
+			xs.append(np.asarray(src.x(i,min(i+step,n)),dtype=float)[::w])
+		if w==1:
+			los.append(y)
+			continue
+		full=len(y)//w*w
+		bins=y[:full].reshape(-1,w)
+		lo=[np.fmin.reduce(bins,axis=1)]
+		hi=[np.fmax.reduce(bins,axis=1)]
+		if full < len(y):
+			lo.append([np.fmin.reduce(y[full:])])
+			hi.append([np.fmax.reduce(y[full:])])
+		los.append(np.concatenate(lo))
+		his.append(np.concatenate(hi))
+	lo=np.concatenate(los) if los else np.empty(0,dtype=np.float32)
+	hi=np.concatenate(his) if w > 1 else None
+	x=np.concatenate(xs) if uniform is None else None
+	levels=[{'w':w,'lo':lo,'hi':hi,'x':x}]
+	while len(lo) > min_bins:
+		# an odd bin out at the end stays as it is, as in Envelope
+		m=len(lo)//2*2
+		hi=lo if hi is None else hi
+		lo=np.concatenate((np.fmin(lo[:m:2],lo[1:m:2]),lo[m:]))
+		hi=np.concatenate((np.fmax(hi[:m:2],hi[1:m:2]),hi[m:]))
+		x=None if x is None else x[::2]
+		w*=2
+		levels.append({'w':w,'lo':lo,'hi':hi,'x':x})
+	out={'n':n,'levels':levels}
+	if uniform is not None:
+		out['x0'],out['dt']=uniform
+	return out
+
+def _spacing(src:Source) -> tuple[float,float]|None:
+	"""
+	(x0,dt) if the samples of src are evenly spaced, None if their x has to be stored.
+	x that isn't numeric (dates) is replaced by the sample number.
+	"""
+	if src.evenly_spaced:
+		return (float(src.x0),float(src.dt))
+	n=len(src)
+	if not src.numeric_x or (n and np.asarray(src.x(0,1)).dtype.kind not in 'iuf'):
+		return (0.0,1.0)
+	x0=float(src.x(0,1)[0]) if n else 0.0
+	if n < 2:
+		return (x0,1.0)
+	dt=(float(src.x(n-1,n)[0])-x0)/(n-1)
+	# x read from the data may still turn out to be evenly spaced, and then needn't be stored
+	for i in range(0,n,src.chunk):
+		x=np.asarray(src.x(i,min(i+src.chunk,n)),dtype=float)
+		if np.abs(x-(x0+dt*np.arange(i,i+len(x)))).max() > 1e-6*abs(dt):
+			return None
+	return (x0,dt)
+
+def _finite(v) -> float|None:
+	v=float(v)
+	return v if np.isfinite(v) else None
+
+def export_html(fig:'Backend',pth:str,max_points:int=1<<21,title:str|None=None):
+	"""
+	Write the lines of fig to pth as a self-contained HTML page: each trace as a
+	pyramid of min/max levels (see `pyramid`), compressed and embedded, and a small
+	viewer that decompresses only the level needed for the current zoom. Drag to
+	pan, scroll to zoom in x (with shift, in y), double-click to go back.
+
+	Lines plotted from a Source, or decimated from a longer array, are exported at
+	full resolution. Only lines are exported, not images, fills or axis lines.
+	"""
+	desc=fig.describe()
+	blobs=[]
+	dtypes=[]
+	def add(a,dtype:str) -> int|None:
+		if a is None:
+			return None
+		data=np.ascontiguousarray(a,dtype='<'+dtype).tobytes()
+		blobs.append(base64.b64encode(zlib.compress(data,6)).decode('ascii'))
+		dtypes.append(dtype)
+		return len(blobs)-1
+	axes=[]
+	for ax in desc['axes']:
+		traces=[]
+		for line in ax['lines']:
+			pyr=pyramid(line['source'],max_points)
+			levels=[{'w':lv['w'],'n':len(lv['lo']),'lo':add(lv['lo'],'f4'),'hi':add(lv['hi'],'f4'),
+					 'x':add(lv['x'],'f8')} for lv in pyr['levels']]
+			traces.append({'label':line['label'],'color':line['color'],'width':line['width'],
+				'style':line['style'],'n':pyr['n'],'x0':pyr.get('x0'),'dt':pyr.get('dt'),'levels':levels})
+		axes.append({'title':ax['title'],'xlabel':ax['xlabel'],'ylabel':ax['ylabel'],
+			'xlog':ax['xlog'],'ylog':ax['ylog'],'legend':ax['legend'],
+			'xlim':[_finite(v) for v in ax['xlim']],'ylim':[_finite(v) for v in ax['ylim']],'traces':traces})
+	spec={'title':desc['title'] if title is None else title,'width':int(desc['width']),
+		  'height':int(desc['height']),'axes':axes,'blobs':dtypes}
+	# "</" would end the script element early
+	spec_json=json.dumps(spec).replace("</","<\\/")
+	page_title=spec['title'] or "figure"
+	with open(pth,'w',encoding='utf-8') as f:
+		f.write(_HEAD.replace("{title}",_escape(page_title)))
+		f.write(f'<script type="application/json" id="spec">{spec_json}</script>\n')
+		for i,b in enumerate(blobs):
+			f.write(f'<script type="application/octet-stream" id="b{i}">{b}</script>\n')
+		f.write(_VIEWER)
+
+def _escape(s:str) -> str:
+	return s.replace("&","&amp;").replace("<","&lt;").replace(">","&gt;")
+
+_HEAD="""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body{margin:0;font:13px sans-serif;background:#fff}
+#fig{display:flex;flex-direction:column;align-items:center}
+#fig h1{font-size:16px;font-weight:normal;margin:8px}
+canvas{cursor:grab;touch-action:none}
+</style></head><body><div id="fig"></div>
+"""
+
+_VIEWER="""<script>
+"use strict";
+const S=JSON.parse(document.getElementById("spec").textContent);
+const cache={};
+function blob(id){
+	if(!(id in cache)){
+		const s=atob(document.getElementById("b"+id).textContent);
+		const u=new Uint8Array(s.length);
+		for(let i=0;i<s.length;i++)u[i]=s.charCodeAt(i);
+		const stream=new Blob([u]).stream().pipeThrough(new DecompressionStream("deflate"));
+		cache[id]=new Response(stream).arrayBuffer().then(b=>cache[id]=S.blobs[id]=="f8"?new Float64Array(b):new Float32Array(b));
+	}
+	return cache[id];
+}
+const ready=id=>id===null||ArrayBuffer.isView(cache[id]);
+const levelReady=lv=>ready(lv.lo)&&ready(lv.hi)&&ready(lv.x);
+const load=lv=>Promise.all([lv.lo,lv.hi,lv.x].filter(id=>id!==null).map(blob));
+const T=(v,log)=>log?Math.log10(v):v;
+const I=(v,log)=>log?10**v:v;
+const DASH={"--":[6,4],":":[2,3],"-.":[6,3,2,3]};
+const M={l:70,r:12,t:24,b:44};
+function fmt(v){
+	if(v===0)return "0";
+	const a=Math.abs(v);
+	return a>=1e5||a<1e-3?v.toExponential(1).replace("e+","e"):String(+v.toPrecision(6));
+}
+function ticks(lo,hi,log){
+	if(log&&hi-lo>=1.5){
+		const out=[],every=Math.ceil((hi-lo)/8);
+		for(let e=Math.ceil(lo);e<=hi;e+=every)out.push(e);
+		return out.map(e=>[e,"1e"+e]);
+	}
+	const span=(hi-lo)||1,raw=span/6,p=10**Math.floor(Math.log10(raw));
+	const step=[1,2,5,10].map(m=>m*p).find(s=>s>=raw);
+	const out=[];
+	for(let v=Math.ceil(lo/step)*step;v<=hi+step*1e-9;v+=step)out.push([v,fmt(log?10**v:v)]);
+	return out;
+}
+// the index of the first bin at or after x, in bins of lv
+function binAt(tr,lv,x){
+	if(lv.x===null)return (x-tr.x0)/(tr.dt*lv.w);
+	const a=cache[lv.x];
+	let lo=0,hi=a.length;
+	while(lo<hi){const m=(lo+hi)>>1;if(a[m]<x)lo=m+1;else hi=m;}
+	return lo;
+}
+class Axes{
+	constructor(spec,width,height){
+		this.s=spec;
+		const dpr=window.devicePixelRatio||1;
+		this.c=document.createElement("canvas");
+		this.c.width=width*dpr;this.c.height=height*dpr;
+		this.c.style.width=width+"px";this.c.style.height=height+"px";
+		this.g=this.c.getContext("2d");this.g.scale(dpr,dpr);
+		this.w=width;this.h=height;
+		this.home=this.limits();
+		this.v={...this.home};
+		this.pending=false;
+		this.events();
+	}
+	limits(){
+		const s=this.s,xs=[],ys=[];
+		for(const tr of s.traces){
+			const lv=tr.levels[tr.levels.length-1];
+			if(!levelReady(lv))continue;
+			const lo=cache[lv.lo],hi=lv.hi===null?lo:cache[lv.hi];
+			for(let j=0;j<lo.length;j++){
+				const x=lv.x===null?tr.x0+tr.dt*lv.w*j:cache[lv.x][j];
+				if(isFinite(T(x,s.xlog)))xs.push(T(x,s.xlog));
+				for(const y of [lo[j],hi[j]])if(isFinite(T(y,s.ylog)))ys.push(T(y,s.ylog));
+			}
+		}
+		const range=(lim,log,data)=>{
+			if(lim[0]!==null&&lim[1]!==null&&(!log||lim[0]>0))return [T(lim[0],log),T(lim[1],log)];
+			if(!data.length)return [0,1];
+			let a=Math.min(...data),b=Math.max(...data);
+			if(a===b){a-=0.5;b+=0.5;}
+			return [a,b];
+		};
+		const [x0,x1]=range(s.xlim,s.xlog,xs),[y0,y1]=range(s.ylim,s.ylog,ys);
+		return {x0,x1,y0,y1};
+	}
+	redraw(){
+		if(this.pending)return;
+		this.pending=true;
+		requestAnimationFrame(()=>{this.pending=false;this.draw();});
+	}
+	draw(){
+		const g=this.g,s=this.s,v=this.v;
+		const pw=this.w-M.l-M.r,ph=this.h-M.t-M.b;
+		const sx=t=>M.l+(t-v.x0)/(v.x1-v.x0)*pw,sy=t=>M.t+(v.y1-t)/(v.y1-v.y0)*ph;
+		g.clearRect(0,0,this.w,this.h);
+		g.font="12px sans-serif";g.fillStyle="#000";g.strokeStyle="#ddd";g.lineWidth=1;
+		g.textAlign="center";g.textBaseline="top";
+		for(const [t,label] of ticks(v.x0,v.x1,s.xlog)){
+			const p=Math.round(sx(t))+0.5;
+			g.beginPath();g.moveTo(p,M.t);g.lineTo(p,M.t+ph);g.stroke();
+			g.fillText(label,p,M.t+ph+4);
+		}
+		g.textAlign="right";g.textBaseline="middle";
+		for(const [t,label] of ticks(v.y0,v.y1,s.ylog)){
+			const p=Math.round(sy(t))+0.5;
+			g.beginPath();g.moveTo(M.l,p);g.lineTo(M.l+pw,p);g.stroke();
+			g.fillText(label,M.l-4,p);
+		}
+		g.strokeStyle="#000";g.strokeRect(M.l+0.5,M.t+0.5,pw,ph);
+		g.textAlign="center";g.textBaseline="bottom";
+		if(s.xlabel)g.fillText(s.xlabel,M.l+pw/2,this.h-2);
+		if(s.title)g.fillText(s.title,M.l+pw/2,M.t-4);
+		if(s.ylabel){g.save();g.translate(14,M.t+ph/2);g.rotate(-Math.PI/2);g.textBaseline="middle";g.fillText(s.ylabel,0,0);g.restore();}
+		g.save();
+		g.beginPath();g.rect(M.l,M.t,pw,ph);g.clip();
+		const xl=I(v.x0,s.xlog),xr=I(v.x1,s.xlog);
+		for(const tr of s.traces)this.trace(tr,xl,xr,pw,sx,sy);
+		g.restore();
+		if(s.legend)this.legend(pw);
+	}
+	trace(tr,xl,xr,pw,sx,sy){
+		const g=this.g,s=this.s,levels=tr.levels;
+		// the finest level with no more than two bins per pixel, or the closest coarser one loaded so far
+		const coarse=levels[levels.length-1];
+		const samples=(binAt(tr,coarse,xr)-binAt(tr,coarse,xl)+1)*coarse.w;
+		let k=levels.findIndex(lv=>samples/lv.w<=2*pw);
+		if(k<0)k=levels.length-1;
+		if(!levelReady(levels[k]))load(levels[k]).then(()=>this.redraw());
+		while(!levelReady(levels[k]))k++;
+		const lv=levels[k],lo=cache[lv.lo],hi=lv.hi===null?lo:cache[lv.hi],xs=lv.x===null?null:cache[lv.x];
+		const j0=Math.max(Math.floor(binAt(tr,lv,xl))-1,0),j1=Math.min(Math.ceil(binAt(tr,lv,xr))+1,lv.n-1);
+		g.strokeStyle=tr.color;g.lineWidth=tr.width;g.setLineDash(DASH[tr.style]||[]);
+		g.beginPath();
+		let down=false;
+		for(let j=j0;j<=j1;j++){
+			const px=sx(T(xs===null?tr.x0+tr.dt*lv.w*j:xs[j],s.xlog));
+			const a=sy(T(lo[j],s.ylog)),b=sy(T(hi[j],s.ylog));
+			if(!isFinite(px)||!isFinite(a)||!isFinite(b)){down=false;continue;}
+			if(down)g.lineTo(px,a);else{g.moveTo(px,a);down=true;}
+			if(b!==a)g.lineTo(px,b);
+		}
+		g.stroke();g.setLineDash([]);
+	}
+	legend(pw){
+		const g=this.g,items=this.s.traces.filter(tr=>tr.label);
+		if(!items.length)return;
+		const w=Math.max(...items.map(tr=>g.measureText(tr.label).width))+40,x=M.l+pw-w-6;
+		g.fillStyle="rgba(255,255,255,0.85)";g.fillRect(x,M.t+6,w,items.length*18+6);
+		g.strokeStyle="#bbb";g.strokeRect(x+0.5,M.t+6.5,w,items.length*18+6);
+		g.textAlign="left";g.textBaseline="middle";
+		items.forEach((tr,i)=>{
+			const y=M.t+18+i*18;
+			g.strokeStyle=tr.color;g.lineWidth=tr.width;g.setLineDash(DASH[tr.style]||[]);
+			g.beginPath();g.moveTo(x+6,y);g.lineTo(x+28,y);g.stroke();g.setLineDash([]);
+			g.fillStyle="#000";g.fillText(tr.label,x+34,y);
+		});
+	}
+	events(){
+		const c=this.c;
+		let drag=null;
+		const pos=e=>{const r=c.getBoundingClientRect();return [e.clientX-r.left,e.clientY-r.top];};
+		c.addEventListener("wheel",e=>{
+			e.preventDefault();
+			const [px,py]=pos(e),f=e.deltaY>0?1.25:0.8,v=this.v;
+			const pw=this.w-M.l-M.r,ph=this.h-M.t-M.b;
+			if(e.shiftKey){
+				const m=v.y1-(py-M.t)/ph*(v.y1-v.y0);
+				v.y0=m+(v.y0-m)*f;v.y1=m+(v.y1-m)*f;
+			}else{
+				const m=v.x0+(px-M.l)/pw*(v.x1-v.x0);
+				v.x0=m+(v.x0-m)*f;v.x1=m+(v.x1-m)*f;
+			}
+			this.redraw();
+		},{passive:false});
+		c.addEventListener("pointerdown",e=>{drag={p:pos(e),v:{...this.v}};c.setPointerCapture(e.pointerId);c.style.cursor="grabbing";});
+		c.addEventListener("pointermove",e=>{
+			if(!drag)return;
+			const [px,py]=pos(e),d=drag.v,pw=this.w-M.l-M.r,ph=this.h-M.t-M.b;
+			const dx=(px-drag.p[0])/pw*(d.x1-d.x0),dy=(py-drag.p[1])/ph*(d.y1-d.y0);
+			this.v={x0:d.x0-dx,x1:d.x1-dx,y0:d.y0+dy,y1:d.y1+dy};
+			this.redraw();
+		});
+		c.addEventListener("pointerup",()=>{drag=null;c.style.cursor="";});
+		c.addEventListener("dblclick",()=>{this.v={...this.home};this.redraw();});
+	}
+}
+(async()=>{
+	const root=document.getElementById("fig");
+	if(S.title){const h=document.createElement("h1");h.textContent=S.title;root.appendChild(h);}
+	// the coarsest level of every trace is loaded up front, to draw while finer ones load
+	await Promise.all(S.axes.flatMap(a=>a.traces.map(tr=>load(tr.levels[tr.levels.length-1]))));
+	const h=Math.max(Math.floor(S.height/S.axes.length),200);
+	for(const spec of S.axes){
+		const ax=new Axes(spec,S.width,h);
+		root.appendChild(ax.c);
+		ax.draw();
+	}
+})();
+</script>
+</body></html>
+"""
@@ -0,0 +1,115 @@
+"""
+Opt-in timing and memory records for each stage of making a figure
+"""
+
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, TextIO
+
+__all__=['Recorder']
+
+# tracemalloc slows every allocation in the process, so it's only on while some
+# recorder's stage is running, unless something else had already turned it on
+_tracing_lock=threading.Lock()
+_tracing_stages=0
+_started_tracing=False
+
+def _start_tracing():
+	global _tracing_stages,_started_tracing
+	with _tracing_lock:
+		if _tracing_stages==0 and not tracemalloc.is_tracing():
+			tracemalloc.start()
+			_started_tracing=True
+		_tracing_stages+=1
+
+def _stop_tracing():
+	global _tracing_stages,_started_tracing
+	with _tracing_lock:
+		_tracing_stages-=1
+		if _tracing_stages==0 and _started_tracing:
+			tracemalloc.stop()
+			_started_tracing=False
+
+class Recorder:
+	"""
+	Collects one event per stage run, as a dict with the keys
+
+		stage    the name of the stage, e.g. "savefig"
+		fig      the index of the figure in its figure_wrapper
+		seconds  wall time
+		points   the number of data points the stage handled, 0 if it doesn't apply
+		peak_mb  the most memory allocated during the stage, if memory is on
+
+	Parameters
+	----------
+	enabled:bool
+		A disabled recorder does nothing, so it can always be called
+	memory:bool
+		Also record allocation peaks with tracemalloc, which is on only while a stage
+		runs. Slows the stages down, and the peak of a stage run inside another one
+		resets the outer one's
+	callback:Callable|None
+		Called with every event as it happens
+	report:bool
+		Whether the owning figure_wrapper should print the summary when it exits
+	"""
+	enabled:bool
+	memory:bool
+	events:list
+	def __init__(self,enabled:bool=True,memory:bool=False,callback:Callable[[dict],None]|None=None,report:bool=False):
+		self.enabled=enabled
+		self.memory=memory
+		self.callback=callback
+		self.report=report
+		self.events=[]
+
+	@contextmanager
+	def stage(self,name:str,fig:int=0,points:int=0):
+		if not self.enabled:
+			yield
+			return
+		if self.memory:
+			_start_tracing()
+			base=tracemalloc.get_traced_memory()[0]
+			tracemalloc.reset_peak()
+		start=time.perf_counter()
+		try:
+			yield
+		finally:
+			event={'stage':name,'fig':fig,'seconds':time.perf_counter()-start,'points':points}
+			if self.memory:
+				event['peak_mb']=(tracemalloc.get_traced_memory()[1]-base)/2**20
+				_stop_tracing()
+			self.events.append(event)
+			if self.callback is not None:
+				self.callback(event)
+
+	def summary(self) -> dict:
+		"""
+		The events totalled per figure and stage:
+		{fig: {stage: {"calls","seconds","points","peak_mb"}}}
+		"""
+		res={}
+		for e in self.events:
+			s=res.setdefault(e['fig'],{}).setdefault(e['stage'],{'calls':0,'seconds':0.0,'points':0,'peak_mb':0.0})
+			s['calls']+=1
+			s['seconds']+=e['seconds']
+			s['points']+=e['points']
+			s['peak_mb']=max(s['peak_mb'],e.get('peak_mb',0.0))
+		return res
+
+	def dump(self,file:TextIO=sys.stdout):
+		"""print the summary as a table"""
+		for fig,stages in self.summary().items():
+			print(f"figure {fig}:",file=file)
+			for name,s in sorted(stages.items(),key=lambda kv:-kv[1]['seconds']):
+				line=f"  {name:14} {s['calls']:5d}x {s['seconds']*1e3:10.1f} ms {s['points']:12d} pts"
+				if self.memory:
+					line+=f" {s['peak_mb']:9.1f} MB"
+				print(line,file=file)
+
+	def clear(self):
+		self.events=[]
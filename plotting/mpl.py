@@ -2,29 +2,109 @@
 The backend for Matplotlib
 """
 
+import threading
 import numpy as np
 from typing import Iterable
 from matplotlib.axes import Axes
 from matplotlib.artist import Artist
 from matplotlib.figure import Figure
-from matplotlib import legend, pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.backend_bases import TimerBase
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib import legend, rcParams, pyplot as plt
+from .ring import RingBuffer
+
+class FigurePool:
+	"""
+	Cleared headless figures kept for reuse, keyed on size and dpi, so a long-running
+	process that renders figure after figure isn't building a new Figure and canvas
+	every time. At most `maxsize` spare figures are kept per key.
+	"""
+	maxsize:int
+	def __init__(self,maxsize:int=8):
+		self.maxsize=maxsize
+		self._free={}
+		self._lock=threading.Lock()
+
+	@staticmethod
+	def _key(figsize,dpi):
+		return (tuple(float(v) for v in figsize),float(dpi))
+
+	def acquire(self,figsize=None,dpi=None) -> Figure:
+		"""A blank figure with an Agg canvas, that pyplot knows nothing about"""
+		figsize=rcParams['figure.figsize'] if figsize is None else figsize
+		dpi=rcParams['figure.dpi'] if dpi is None else dpi
+		with self._lock:
+			free=self._free.get(self._key(figsize,dpi))
+			if free:
+				return free.pop()
+		fig=Figure(figsize=figsize,dpi=dpi)
+		FigureCanvasAgg(fig)
+		return fig
+
+	def release(self,fig:Figure):
+		"""Clear the figure and keep it for the next acquire, if there's room"""
+		fig.clear()
+		# depending on the matplotlib version clear() can leave the layout engine and
+		# the margins tight_layout picked, which would carry over to the next figure
+		fig.set_layout_engine(None)
+		fig.subplots_adjust(**{k:rcParams[f'figure.subplot.{k}'] for k in ('left','right','bottom','top','wspace','hspace')})
+		with self._lock:
+			free=self._free.setdefault(self._key(fig.get_size_inches(),fig.dpi),[])
+			if len(free) < self.maxsize:
+				free.append(fig)
+
+	def __len__(self):
+		with self._lock:
+			return sum(len(v) for v in self._free.values())
+
+pool=FigurePool()
 
 class MPL_fig: 
 	fig:Figure
 	axes:list
+	downsamples:bool=False
 	tighten:bool
 	log_axis:int
 	simple_axis_labels:bool
-	def __init__(self,title:str=""):
-		self.fig=plt.figure()
-		self.fig.suptitle(title)
-		self.axes=[self.fig.gca()]
+	streams:dict
+	rezoom_delay:int
+	headless:bool
+	def __init__(self,title:str="",headless:bool=False,figsize=None,dpi=None,fig:Figure|None=None):
+		"""
+		With headless=True the figure comes from the pool with its own Agg canvas instead
+		of from pyplot, so it's never registered with pyplot and can be handed back with
+		close() once it's been saved.
+
+		`fig` wraps a Figure that already exists (e.g. one unpickled in a worker) instead
+		of making one; its axes are kept as they are.
+		"""
+		self.headless=headless
+		if fig is not None:
+			self.fig=fig
+		elif headless:
+			self.fig=pool.acquire(figsize,dpi)
+		else:
+			self.fig=plt.figure(figsize=figsize,dpi=dpi)
+		if fig is None:
+			self.fig.suptitle(title)
+		self.axes=list(self.fig.axes) or [self.fig.gca()]
 		self._fontsize=12
+		# only set once fontsize is, until then legends use the matplotlib default
+		self._legend_fontsize=None
 		self._axis=0
 		self.log_axis=0
 		self.tighten=True
 		self.simple_axis_labels=False
-		plt.autoscale(True,axis='both')
+		self.streams={}
+		# lines to re-decimate when their axes are zoomed, see track
+		self._tracked={}
+		self._pending=set()
+		self._timer=None
+		self.rezoom_delay=100
+		self._setting_xlim=False
+		if fig is None:
+			self.axis.autoscale(True,axis='both')
 
 	def plot(self, *args, **kwargs):
 		if not self.axes:
@@ -57,12 +137,185 @@ class MPL_fig:
 		self.log_axis=3
 		return line
 
+	def plot_many(self,x:Iterable,Y:Iterable,colors=None,cmap=None,**kwargs):
+		"""
+		Draw every row of Y as a line, all in one LineCollection.
+
+		x is either shared by every row or the same shape as Y. Give `colors` for one
+		color per row (or one for all of them), or `cmap` to color the rows by index.
+		"""
+		if not self.axes:
+			self.create_axes(1,1)
+		Y=np.atleast_2d(np.asarray(Y,dtype=float))
+		X=np.broadcast_to(np.asarray(x,dtype=float),Y.shape)
+		segs=np.stack([X,Y],axis=-1)
+		if colors is None and cmap is None:
+			colors=kwargs.pop('color',None) or self.axis._get_lines.get_next_color()
+		lines=LineCollection(segs,colors=colors,**kwargs) #pyright:ignore
+		if colors is None:
+			lines.set_array(np.arange(len(Y)))
+			lines.set_cmap(cmap)
+		self.axis.add_collection(lines,autolim=True)
+		self.axis.autoscale_view()
+		self.axis.grid(True)
+		return lines
+
+	def envelope(self,x:Iterable,lo:Iterable,hi:Iterable,mean:Iterable|None=None,artists=None,alpha:float=0.3,**kwargs):
+		"""
+		Fill between lo and hi, with the mean drawn on top if given. Pass the artists
+		returned by an earlier call to redraw them with new data instead of adding more.
+		"""
+		if not self.axes:
+			self.create_axes(1,1)
+		band,line=artists if artists is not None else (None,None)
+		if line is not None:
+			line.set_data(x,mean)
+		elif mean is not None:
+			(line,)=self.axis.plot(x,mean,**kwargs)
+		if band is not None:
+			color=band.get_facecolor()[0][:3]
+			band.remove()
+		elif line is not None:
+			color=line.get_color()
+		else:
+			color=kwargs.get('color') or self.axis._get_lines.get_next_color()
+		label=kwargs.get('label') if line is None else None
+		band=self.axis.fill_between(x,lo,hi,color=color,alpha=alpha,linewidth=0,label=label)
+		self.axis.relim()
+		self.axis.autoscale_view()
+		self.axis.grid(True)
+		return band,line
+
+	def density(self,counts:np.ndarray,extent:tuple,cmap:str="viridis",**kwargs):
+		"""
+		Draw a 2-D histogram as an image on a log color scale, with empty cells left
+		blank. counts is indexed [row,column] with row 0 at the bottom of `extent`.
+		"""
+		if not self.axes:
+			self.create_axes(1,1)
+		from matplotlib.colors import LogNorm
+		counts=np.ma.masked_equal(counts,0)
+		vmax=max(int(counts.max() or 1),2)
+		img=self.axis.imshow(counts,extent=extent,origin='lower',aspect='auto',
+						  interpolation='nearest',cmap=cmap,norm=LogNorm(1,vmax),**kwargs)
+		# y autoscaling may be off, which would leave the view at 0..1
+		self.axis.set_xlim(extent[0],extent[1])
+		self.axis.set_ylim(extent[2],extent[3])
+		return img
+
+	def stream(self,name:str,y:Iterable,x:Iterable|None=None,/,
+			capacity:int=1_000_000,
+			dt:float=1.0,
+			refresh:bool=True,
+			**kwargs):
+		"""
+		Append samples to the named trace, keeping the newest `capacity`. The line is
+		created on the first call and updated in place after that.
+		"""
+		y=np.asarray(y,dtype=float).ravel()
+		if name not in self.streams:
+			if not self.axes:
+				self.create_axes(1,1)
+			(line,)=self.axis.plot([],[],label=name,**kwargs)
+			self.axis.grid(True)
+			self.streams[name]=(RingBuffer(capacity),RingBuffer(capacity),line)
+		xbuf,ybuf,line=self.streams[name]
+		if x is None:
+			start=xbuf.last+dt if len(xbuf) else 0.0
+			x=start+dt*np.arange(len(y))
+		xbuf.extend(x)
+		ybuf.extend(y)
+		line.set_data(xbuf.view(),ybuf.view())
+		line.axes.relim()
+		line.axes.autoscale_view()
+		if refresh:
+			self.fig.canvas.draw_idle()
+
+	def clear_stream(self,name:str):
+		"""Empty the named trace, keeping the line"""
+		xbuf,ybuf,line=self.streams[name]
+		xbuf.clear()
+		ybuf.clear()
+		line.set_data([],[])
+
+	def track(self,line,src,method:str|None=None) -> None:
+		"""
+		Re-decimate `line` from `src`, its full resolution Source, whenever the x limits
+		of its axes change. On a canvas with an event loop this waits until the limits
+		have stopped changing for `rezoom_delay` ms, so panning stays smooth; otherwise
+		it happens straight away. `method` is passed on to src.read.
+		"""
+		ax=line.axes
+		if ax not in self._tracked:
+			self._tracked[ax]=[]
+			ax.callbacks.connect('xlim_changed',self._xlim_changed)
+		self._tracked[ax].append((line,src,method))
+
+	def _xlim_changed(self,ax):
+		if self._setting_xlim:
+			return
+		if self._timer is None:
+			timer=self.fig.canvas.new_timer(interval=self.rezoom_delay)
+			# the base timer never fires, e.g. on Agg, so there's nothing to wait for
+			if type(timer) is TimerBase:
+				self.rezoom(ax)
+				return
+			timer.single_shot=True
+			timer.add_callback(self._rezoom_pending)
+			self._timer=timer
+		self._pending.add(ax)
+		self._timer.stop()
+		self._timer.start()
+
+	def _rezoom_pending(self):
+		pending,self._pending=self._pending,set()
+		for ax in pending:
+			self.rezoom(ax)
+		self.fig.canvas.draw_idle()
+
+	def describe(self) -> dict:
+		"""
+		The lines on every axis and how they're drawn, for exporters that draw the
+		figure themselves. Tracked lines come with their full resolution Source.
+		"""
+		from matplotlib.colors import to_hex
+		from .sources import ArraySource
+		axes=[]
+		for ax in self:
+			tracked={id(line):src for line,src,_ in self._tracked.get(ax,[])}
+			lines=[]
+			for line in ax.get_lines():
+				# axline and friends are placed in axes coordinates, not data
+				if line.get_transform()!=ax.transData:
+					continue
+				label=line.get_label()
+				src=tracked.get(id(line)) or ArraySource(line.get_xdata(),line.get_ydata())
+				lines.append({'source':src,'label':"" if label.startswith('_') else label,
+					'color':to_hex(line.get_color()),'width':line.get_linewidth(),'style':line.get_linestyle()})
+			axes.append({'title':ax.get_title(),'xlabel':ax.get_xlabel(),'ylabel':ax.get_ylabel(),
+				'xlog':ax.get_xscale()=="log",'ylog':ax.get_yscale()=="log",'xlim':ax.get_xlim(),
+				'ylim':ax.get_ylim(),'legend':ax.get_legend() is not None,'lines':lines})
+		width,height=self.fig.get_size_inches()*self.fig.dpi
+		return {'title':self.title,'width':width,'height':height,'axes':axes}
+
+	def rezoom(self,ax:Axes|None=None) -> None:
+		"""
+		Re-decimate the tracked lines on `ax` (every axis if None) for its current x
+		limits, from the full resolution data.
+		"""
+		for a in ([ax] if ax is not None else list(self._tracked)):
+			lo,hi=sorted(a.get_xlim())
+			width=4*max(int(a.bbox.width),1)
+			for line,src,method in self._tracked.get(a,[]):
+				line.set_data(*src.read((lo,hi),width,method))
+
 	def create_axes(self,num_x:int,num_y:int, index:int=1):
 		"""
 		Make the given number of subplots within this figure
 		"""
 		for axis in self.axes:
 			axis.remove()
+		self._tracked={}
 		_axes=self.fig.subplots(num_x,num_y, squeeze=False)
 		if isinstance(_axes,Axes):
 			self.axes=[_axes]
@@ -79,12 +332,74 @@ class MPL_fig:
 		"""clear this figure of all its subplots."""
 		self.fig.clear()
 		self.axes=[]
+		self._tracked={}
+
+	def legend(self,**kwargs):
+		"""Add a legend to the current axis, in the figure's fontsize if one was set"""
+		if self._legend_fontsize is not None:
+			kwargs.setdefault('fontsize',self._legend_fontsize)
+		return self.axis.legend(**kwargs)
+
+	def draw(self) -> None:
+		"""Ask this figure's own canvas to redraw when it's next idle"""
+		self.fig.canvas.draw_idle()
+
+	def flush_events(self):
+		self.fig.canvas.flush_events()
+
+	def show(self):
+		plt.show()
+
+	def grid(self,visible:bool=True):
+		for ax in self:
+			ax.grid(visible=visible)
+
+	def autoscale(self,enable:bool=True,tight:bool=False):
+		self.axis.autoscale(enable,axis='y',tight=tight)
+
+	def set_xlim(self,left:float,right:float):
+		# figure_wrapper.set_xlim re-decimates the tracked lines itself, once
+		self._setting_xlim=True
+		try:
+			self.axis.set_xlim(left,right)
+		finally:
+			self._setting_xlim=False
+
+	def set_ylim(self,bot:float,top:float,ax:int|None=None):
+		(self.axis if ax is None else self.axes[ax]).set_ylim(bot,top)
 
-	def set_ylabel(self,label) -> None:
-		self.axis.set_ylabel(label)
+	def get_xlim(self,ax:int|None=None) -> tuple[float,float]:
+		return (self.axis if ax is None else self.axes[ax]).get_xlim()
+
+	def get_ylim(self,ax:int|None=None) -> tuple[float,float]:
+		return (self.axis if ax is None else self.axes[ax]).get_ylim()
+
+	def set_xlabel(self,label:str,ax:int|None=None,**kwargs) -> None:
+		(self.axis if ax is None else self.axes[ax]).set_xlabel(label,kwargs or None)
+
+	def set_ylabel(self,label:str,ax:int|None=None,**kwargs) -> None:
+		(self.axis if ax is None else self.axes[ax]).set_ylabel(label,kwargs or None)
 	
 	def sharex(self,axis) -> None:
 		self.axis.sharex(axis)
+
+	def axline(self,loc:float,axis:str="x"):
+		line=self.axis.axvline if axis=="x" else self.axis.axhline
+		return line(loc,linewidth=2,color='k',linestyle='dashed')
+
+	def tight_layout(self):
+		self.fig.tight_layout()
+
+	def save(self,pth:str,dpi:float|None=None):
+		if dpi is None:
+			self.fig.savefig(fname=pth)
+		else:
+			self.fig.savefig(fname=pth,dpi=dpi)
+
+	@property
+	def style(self) -> tuple:
+		"""what besides the data decides how a saved figure looks"""
+		return (self.fig.get_size_inches(),self.fig.dpi,sorted((k,repr(v)) for k,v in rcParams.items()))
 	
 	@property
 	def title(self) -> str:
@@ -102,7 +417,11 @@ class MPL_fig:
 			for item in ([ax.title, ax.xaxis.label, ax.yaxis.label] +
 							 ax.get_xticklabels() + ax.get_yticklabels()):
 				item.set_fontsize(fs)
-		plt.rcParams.update({'legend.fontsize':fs})
+			leg=ax.get_legend()
+			if leg is not None:
+				for text in leg.get_texts():
+					text.set_fontsize(fs)
+		self._legend_fontsize=fs
 	@property
 	def axis(self) -> Axes:
 		return self.axes[self._axis]
@@ -112,11 +431,31 @@ class MPL_fig:
 			raise IndexError("Requested an axis that is outside the scope of current axes. Please call add_subplot first next time!")
 		self._axis=axis_num
 
+	def close(self):
+		"""
+		Let go of the figure: close it in pyplot, or give it back to the pool if headless.
+		This object can't be used after.
+		"""
+		self.streams={}
+		self._tracked={}
+		self.axes=[]
+		if self.headless:
+			pool.release(self.fig)
+		else:
+			plt.close(self.fig)
+
 	def __del__(self):
 		for axis in self.axes:
 			del axis
 		del self.fig
 
+	@property
+	def pixel_width(self) -> int:
+		"""width of the current axis on screen, in pixels"""
+		if not self.axes:
+			return int(self.fig.bbox.width)
+		return int(self.axis.bbox.width)
+
 	@property
 	def num_subfigs(self):
 		return len(self.axes)
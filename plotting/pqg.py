@@ -4,9 +4,11 @@ The backend for pyqtgraph
 
 
 import pyqtgraph as pg
-from PyQt5.QtGui import QColor
+from PyQt5 import QtCore, QtGui
 from typing import Iterable, Iterator, Callable
 from enum import IntEnum, auto
+import numpy as np
+from .ring import RingBuffer
 
 class arg_dest(IntEnum):
 	PLOT=auto()
@@ -34,39 +36,471 @@ def next_color() -> Iterator[str]:
 		idx=(idx+1)%len(colors)
 
 g_color=next_color()
+# matplotlib's line styles, for kwargs meant for the other backend
+_styles={'-':QtCore.Qt.PenStyle.SolidLine,'--':QtCore.Qt.PenStyle.DashLine,
+		 ':':QtCore.Qt.PenStyle.DotLine,'-.':QtCore.Qt.PenStyle.DashDotLine}
+
 class PQG_fig:
+	"""
+	Every curve is clipped to the view and peak-downsampled to the screen
+	resolution as it's drawn, so traces of many millions of points stay interactive
+	without any decimation up front. Saving goes through pyqtgraph's exporters, so
+	it works offscreen too (QT_QPA_PLATFORM=offscreen).
+	"""
 	fig:pg.GraphicsLayoutWidget
-	axes:list[pg.AxisItem]
+	axes:list[pg.PlotItem]
+	# curves downsample themselves to the view, see plotting.figure_wrapper.source
+	downsamples:bool=True
 	tighten:bool
-	def __init__(self,title:str=""):
-		app=pg.mkQApp(title)
-		self.fig=pg.GraphicsLayoutWidget(show=True)
-		self.axes=[self.fig.addPlot()]
+	log_axis:int
+	streams:dict
+	headless:bool
+	def __init__(self,title:str="",headless:bool=False,figsize=None,dpi=None):
+		"""
+		figsize (inches) and dpi size the window like matplotlib would, and set the
+		resolution saved images come out at.
+		"""
+		self.app=pg.mkQApp(title)
+		self.headless=headless
+		self.dpi=100 if dpi is None else dpi
+		width,height=(6.4,4.8) if figsize is None else figsize
+		self.fig=pg.GraphicsLayoutWidget(show=not headless,title=title)
+		self.fig.resize(int(width*self.dpi),int(height*self.dpi))
+		self.axes=[]
 		self._axis=0
+		self._title=title
+		self._fontsize=12
+		self.log_axis=0
 		self.tighten=False
+		self.streams={}
+		# curves of file Sources, re-read when the x range changes, see track
+		self._tracked={}
+		self._rezooming=False
+		self.create_axes(1,1)
 
 	def process_args(self,
 						dst:arg_dest,
 						color:str="",
 						lw:int=1,
-						):
+						label:str="",
+						linewidth:int|None=None,
+						linestyle:str="-",
+						ls:str|None=None,
+						**kwargs):
+		"""
+		The pyqtgraph arguments for the matplotlib style ones figure_wrapper passes.
+		Anything without an equivalent (alpha, markers...) is ignored
+		"""
 		res={}
 		if dst==arg_dest.PLOT:
-			res['pen']=Default(g_color,gen=next).apply(color,lambda c:pg.mkPen(width=lw,color=c))
+			lw=lw if linewidth is None else linewidth
+			style=_styles.get(ls or linestyle,QtCore.Qt.PenStyle.SolidLine)
+			res['pen']=pg.mkPen(width=lw,color=Default(g_color,gen=next).apply(color),style=style)
+			if label:
+				res['name']=label
 		return res
 
-	def plot(self,x:Iterable,y:Iterable, **kwargs):
+	def _curve(self,x:Iterable,y:Iterable,**kwargs):
+		if not self.axes:
+			self.create_axes(1,1)
 		args=self.process_args(arg_dest.PLOT,**kwargs)
-		self.axis.plot(x,y,**args)
+		curve=self.axis.plot(np.asarray(x),np.asarray(y),**args)
+		# set afterwards, as plot() arguments they're applied before the curve is
+		# in its view and pyqtgraph trips over that
+		curve.setClipToView(True)
+		curve.setDownsampling(auto=True,method='peak')
+		return [curve]
+
+	def plot(self,x:Iterable,y:Iterable, **kwargs):
+		return self._curve(x,y,**kwargs)
+
 	def semilogx(self,x:Iterable, y:Iterable,**kwargs):
-		args=self.process_args(arg_dest.PLOT,**kwargs)
-		self.axis.plot(x,y,**args)
+		lines=self._curve(x,y,**kwargs)
 		self.axis.setLogMode(True,False)
+		self.log_axis=1
+		return lines
 
 	def semilogy(self,x:Iterable, y:Iterable,**kwargs):
-		args=self.process_args(arg_dest.PLOT,**kwargs)
-		self.axis.plot(x,y,**args)
+		lines=self._curve(x,y,**kwargs)
 		self.axis.setLogMode(False,True)
+		self.log_axis=2
+		return lines
+
+	def loglog(self,x:Iterable,y:Iterable,**kwargs):
+		lines=self._curve(x,y,**kwargs)
+		self.axis.setLogMode(True,True)
+		self.log_axis=3
+		return lines
+
+	def plot_many(self,x:Iterable,Y:Iterable,colors=None,cmap=None,lw:int=1,label:str="",**kwargs):
+		"""
+		Draw every row of Y as a line. With a single color this is one curve with the
+		rows joined end to end, separated by NaN; with per-row colors or
+		a colormap each row needs its own pen, so it is one curve per row.
+		"""
+		if not self.axes:
+			self.create_axes(1,1)
+		Y=np.atleast_2d(np.asarray(Y,dtype=float))
+		X=np.broadcast_to(np.asarray(x,dtype=float),Y.shape)
+		if cmap is not None:
+			colors=[c.name() for c in pg.colormap.get(cmap,source='matplotlib').getLookupTable(nPts=len(Y),mode='qcolor')]
+		if colors is None or isinstance(colors,str):
+			pen=self.process_args(arg_dest.PLOT,color=colors or "",lw=lw)['pen']
+			# a NaN after every row breaks the line between one trace and the next
+			xs=np.full((len(Y),Y.shape[1]+1),np.nan)
+			ys=np.full_like(xs,np.nan)
+			xs[:,:-1]=X
+			ys[:,:-1]=Y
+			# no clipToView or downsampling here, both assume x only ever increases
+			curve=self.axis.plot(xs.ravel(),ys.ravel(),connect='finite',pen=pen,name=label or None)
+			return [curve]
+		curves=[]
+		for xs,ys,c in zip(X,Y,colors):
+			curves.append(self.axis.plot(xs,ys,pen=pg.mkPen(width=lw,color=c)))
+		return curves
+
+	def envelope(self,x:Iterable,lo:Iterable,hi:Iterable,mean:Iterable|None=None,artists=None,alpha:float=0.3,**kwargs):
+		"""
+		Fill between lo and hi, with the mean drawn on top if given. Pass the artists
+		returned by an earlier call to update them in place.
+		"""
+		if artists is not None:
+			lo_curve,hi_curve,line=artists
+			lo_curve.setData(x,lo)
+			hi_curve.setData(x,hi)
+			if line is not None:
+				line.setData(x,mean)
+			return artists
+		if not self.axes:
+			self.create_axes(1,1)
+		# pick the color once, for both the band and the mean
+		kwargs['color']=self.process_args(arg_dest.PLOT,**kwargs)['pen'].color().name()
+		fill=QtGui.QColor(kwargs['color'])
+		fill.setAlphaF(alpha)
+		lo_curve=self.axis.plot(x,lo,pen=None)
+		hi_curve=self.axis.plot(x,hi,pen=None)
+		self.axis.addItem(pg.FillBetweenItem(lo_curve,hi_curve,brush=pg.mkBrush(fill)))
+		line=None
+		if mean is not None:
+			(line,)=self._curve(x,mean,**kwargs)
+		return lo_curve,hi_curve,line
+
+	def density(self,counts:np.ndarray,extent:tuple,cmap:str="viridis",**kwargs):
+		"""
+		Draw a 2-D histogram as an ImageItem, coloured by log10 of the counts with
+		empty cells transparent.
+		"""
+		if not self.axes:
+			self.create_axes(1,1)
+		levels=np.log10(np.maximum(counts,1).astype(float))
+		levels[counts==0]=np.nan
+		img=pg.ImageItem(levels.T,axisOrder='col-major')
+		img.setColorMap(pg.colormap.get(cmap,source='matplotlib'))
+		left,right,bottom,top=extent
+		img.setRect(left,bottom,right-left,top-bottom)
+		self.axis.addItem(img)
+		return img
+
+	def stream(self,name:str,y:Iterable,x:Iterable|None=None,/,
+			capacity:int=1_000_000,
+			dt:float=1.0,
+			refresh:bool=True,
+			**kwargs):
+		"""
+		Append a chunk of samples to the named trace, keeping only the newest `capacity`.
+
+		The first call for a name creates the curve on the current axis; after that the
+		same curve is updated in place with setData, so nothing accumulates however long
+		the acquisition runs.
+
+		Parameters
+		----------
+		name:str
+			The trace to append to
+		y:Iterable
+			The new samples
+		x:Iterable|None
+			The x of the new samples. If not given, x counts up from the last sample
+			in steps of `dt`
+		capacity:int
+			How many samples to keep. Only used when the trace is created
+		dt:float
+			The sample spacing, used when x isn't given
+		refresh:bool
+			Process Qt events after the update so the window repaints. Set False if
+			you're streaming several traces and refresh once at the end
+		"""
+		y=np.asarray(y,dtype=float).ravel()
+		if name not in self.streams:
+			if not self.axes:
+				self.create_axes(1,1)
+			args=self.process_args(arg_dest.PLOT,**kwargs)|{'name':name}
+			curve=self.axis.plot(**args)
+			curve.setClipToView(True)
+			curve.setDownsampling(auto=True,method='peak')
+			curve.setSkipFiniteCheck(True)
+			self.streams[name]=(RingBuffer(capacity),RingBuffer(capacity),curve)
+		xbuf,ybuf,curve=self.streams[name]
+		if x is None:
+			start=xbuf.last+dt if len(xbuf) else 0.0
+			x=start+dt*np.arange(len(y))
+		xbuf.extend(x)
+		ybuf.extend(y)
+		curve.setData(xbuf.view(),ybuf.view())
+		if refresh:
+			self.app.processEvents()
+
+	def clear_stream(self,name:str):
+		"""Empty the named trace, keeping the curve"""
+		xbuf,ybuf,curve=self.streams[name]
+		xbuf.clear()
+		ybuf.clear()
+		curve.setData([],[])
+
+	def legend(self,**kwargs):
+		"""
+		Add a legend to the current axis, listing the named curves already on it.
+		matplotlib's loc and the like are ignored; drag it where it's wanted.
+		"""
+		if self.axis.legend is None:
+			leg=self.axis.addLegend()
+			for item in self.axis.listDataItems():
+				if item.name():
+					leg.addItem(item,item.name())
+			self._style_text()
+		return self.axis.legend
+
+	def draw(self):
+		self.app.processEvents()
+
+	def flush_events(self):
+		self.app.processEvents()
+
+	def show(self):
+		"""Show the window and run Qt's event loop until it's closed"""
+		self.fig.show()
+		pg.exec()
+
+	def create_axes(self,num_x:int,num_y:int, index:int=1):
+		"""
+		Replace the plots with a num_x by num_y grid of them, numbered row by row
+		"""
+		self.clear()
+		self.axes=[self.fig.addPlot(row=r,col=c) for r in range(num_x) for c in range(num_y)]
+		self._axis=0
+		self.log_axis=0
+		self.title=self._title
+		self._style_text()
+
+	def __iter__(self):
+		yield from self.axes
+
+	def clear(self):
+		"""clear this figure of all its subplots."""
+		# empty the plots first, curves clipped to the view fail when their plot is
+		# taken out of the layout from under them
+		for ax in self.axes:
+			ax.clear()
+		self.fig.clear()
+		self.axes=[]
+		self.streams={}
+		self._tracked={}
+
+	def grid(self,visible:bool=True):
+		for ax in self:
+			ax.showGrid(x=visible,y=visible,alpha=0.3)
+
+	def autoscale(self,enable:bool=True,tight:bool=False):
+		self.axis.enableAutoRange(axis='y',enable=enable)
+
+	def _log(self,ax,side:str) -> bool:
+		return ax.getAxis(side).logMode
+
+	def _to_view(self,ax,side:str,*vals):
+		# in log mode pyqtgraph's view coordinates are log10 of the data
+		if self._log(ax,side):
+			return tuple(float(np.log10(v)) for v in vals)
+		return vals
+
+	def _from_view(self,ax,side:str,lims):
+		if self._log(ax,side):
+			return tuple(10**v for v in lims)
+		return tuple(lims)
+
+	def set_xlim(self,left:float,right:float):
+		# figure_wrapper.set_xlim re-reads the tracked curves itself, once
+		self._rezooming=True
+		try:
+			self.axis.setXRange(*self._to_view(self.axis,'bottom',left,right),padding=0)
+		finally:
+			self._rezooming=False
+
+	def set_ylim(self,bot:float,top:float,ax:int|None=None):
+		axis=self.axis if ax is None else self.axes[ax]
+		axis.setYRange(*self._to_view(axis,'left',bot,top),padding=0)
+
+	def get_xlim(self,ax:int|None=None) -> tuple[float,float]:
+		axis=self.axis if ax is None else self.axes[ax]
+		return self._from_view(axis,'bottom',axis.viewRange()[0])
+
+	def get_ylim(self,ax:int|None=None) -> tuple[float,float]:
+		axis=self.axis if ax is None else self.axes[ax]
+		return self._from_view(axis,'left',axis.viewRange()[1])
+
+	def set_xlabel(self,label:str,ax:int|None=None,**kwargs):
+		(self.axis if ax is None else self.axes[ax]).setLabel('bottom',label)
+		self._style_text()
+
+	def set_ylabel(self,label:str,ax:int|None=None,**kwargs):
+		(self.axis if ax is None else self.axes[ax]).setLabel('left',label)
+		self._style_text()
+
+	def sharex(self,axis) -> None:
+		self.axis.setXLink(axis)
+
+	def axline(self,loc:float,axis:str="x"):
+		side='bottom' if axis=="x" else 'left'
+		(pos,)=self._to_view(self.axis,side,loc)
+		pen=pg.mkPen(width=2,color='k',style=_styles['--'])
+		return self.axis.addLine(**{axis:pos},pen=pen)
+
+	def tight_layout(self):
+		# the layout already fits everything in
+		pass
+
+	def save(self,pth:str,dpi:float|None=None):
+		"""
+		Export the whole window to pth: svg as vectors, anything else as an image, at
+		`dpi` if given, otherwise the figure's own
+		"""
+		from pyqtgraph import exporters
+		self.app.processEvents()
+		if pth.lower().endswith('.svg'):
+			exporters.SVGExporter(self.fig.scene()).export(pth)
+			return
+		# Qt can't write pdf or eps, and the exporter only says so by returning False
+		ext=pth.rsplit('.',1)[-1].lower() if '.' in pth else ""
+		supported=sorted(bytes(f).decode() for f in QtGui.QImageWriter.supportedImageFormats())
+		if ext not in supported:
+			raise ValueError(f"Format '{ext}' is not supported by the pyqtgraph backend (supported formats: svg, {', '.join(supported)})")
+		exporter=exporters.ImageExporter(self.fig.scene())
+		scale=(dpi or self.dpi)/self.dpi
+		exporter.parameters()['width']=int(self.fig.width()*scale)
+		if exporter.export(pth) is False:
+			raise OSError(f"couldn't save {pth}")
+
+	@property
+	def style(self) -> tuple:
+		"""what besides the data decides how a saved figure looks"""
+		return (self.fig.width(),self.fig.height(),self.dpi,self._fontsize,sorted(pg.CONFIG_OPTIONS.items()))
+
+	def _style_text(self):
+		font=QtGui.QFont()
+		font.setPointSize(self._fontsize)
+		for ax in self:
+			for side in ('left','bottom'):
+				ax.getAxis(side).setStyle(tickFont=font)
+				ax.getAxis(side).label.setFont(font)
+			ax.titleLabel.setText(ax.titleLabel.text,size=f"{self._fontsize}pt")
+			if ax.legend is not None:
+				ax.legend.setLabelTextSize(f"{self._fontsize}pt")
+
+	@property
+	def title(self) -> str:
+		return self._title
+	@title.setter
+	def title(self,s:str):
+		self._title=s
+		self.fig.setWindowTitle(s)
+		if self.axes:
+			self.axes[0].setTitle(s or None)
+	@property
+	def fontsize(self) -> int:
+		return self._fontsize
+	@fontsize.setter
+	def fontsize(self,fs:int):
+		self._fontsize=fs
+		self._style_text()
+
+	@property
+	def num_subfigs(self):
+		return len(self.axes)
+	@num_subfigs.setter
+	def num_subfigs(self,spec):
+		if sum(spec)-len(spec) >= self.num_subfigs:
+			self.create_axes(*spec)
+
+	@property
+	def pixel_width(self) -> int:
+		"""width of the current plot area on screen, in pixels"""
+		if not self.axes:
+			return int(self.fig.width())
+		# the view has no size until the layout has run
+		return int(self.axis.vb.width()) or int(self.fig.width())
+
+	def close(self):
+		self.streams={}
+		self.axes=[]
+		self.fig.close()
+
+	def describe(self) -> dict:
+		"""
+		The curves on every axis and how they're drawn, for exporters that draw the
+		figure themselves. Array curves keep all their data; tracked ones come with
+		their full resolution Source rather than the part on screen.
+		"""
+		from .sources import ArraySource
+		axes=[]
+		for ax in self:
+			# auto-ranging is otherwise put off until the view is next painted
+			ax.vb.updateAutoRange()
+			tracked={id(line):src for line,src,_ in self._tracked.get(ax,[])}
+			lines=[]
+			for item in ax.listDataItems():
+				if item.xData is None:
+					continue
+				pen=pg.mkPen(item.opts['pen'])
+				style={v:k for k,v in _styles.items()}.get(pen.style(),'-')
+				src=tracked.get(id(item)) or ArraySource(item.xData,item.yData)
+				lines.append({'source':src,'label':item.name() or "",
+					'color':pen.color().name(),'width':pen.widthF() or 1,'style':style})
+			(x0,x1),(y0,y1)=ax.viewRange()
+			xlog,ylog=self._log(ax,'bottom'),self._log(ax,'left')
+			axes.append({'title':ax.titleLabel.text,'xlabel':ax.getAxis('bottom').labelText,
+				'ylabel':ax.getAxis('left').labelText,'xlog':xlog,'ylog':ylog,
+				'xlim':(10**x0,10**x1) if xlog else (x0,x1),'ylim':(10**y0,10**y1) if ylog else (y0,y1),
+				'legend':ax.legend is not None,'lines':lines})
+		return {'title':self._title,'width':self.fig.width(),'height':self.fig.height(),'axes':axes}
+
+	def track(self,line,src,method=None):
+		"""
+		Re-read `line` from `src` whenever the x range of its plot changes. Only file
+		Sources are decimated before they get here; arrays are given whole, and
+		clipToView and downsampling take care of them.
+		"""
+		ax=self.axis
+		if ax not in self._tracked:
+			self._tracked[ax]=[]
+			ax.sigXRangeChanged.connect(lambda *_,ax=ax:self._range_changed(ax))
+		self._tracked[ax].append((line,src,method))
+
+	def _range_changed(self,ax):
+		if not self._rezooming:
+			self.rezoom(ax)
+
+	def rezoom(self,ax=None):
+		"""
+		Re-read the tracked curves on `ax` (every plot if None) for its current x range
+		"""
+		self._rezooming=True
+		try:
+			for a in ([ax] if ax is not None else list(self._tracked)):
+				lo,hi=sorted(self._from_view(a,'bottom',a.viewRange()[0]))
+				width=4*(int(a.vb.width()) or int(self.fig.width()))
+				for line,src,method in self._tracked.get(a,[]):
+					line.setData(*src.read((lo,hi),width,method))
+		finally:
+			self._rezooming=False
 
 	@property
 	def axis(self):
@@ -0,0 +1,60 @@
+"""
+Fixed-capacity buffer for streaming data into a trace
+"""
+
+import numpy as np
+from typing import Iterable
+
+__all__=['RingBuffer']
+
+class RingBuffer:
+	"""
+	A fixed-capacity FIFO of samples.
+
+	Every sample is written twice, `capacity` apart, so the newest `capacity` samples
+	are always available as one contiguous view (no copy, no np.roll) that can be
+	handed straight to the backend.
+	"""
+	capacity:int
+	size:int
+	def __init__(self,capacity:int,dtype=float):
+		if capacity < 1:
+			raise ValueError("capacity must be at least 1")
+		self.capacity=capacity
+		self._buf=np.zeros(2*capacity,dtype=dtype)
+		self._head=0
+		self.size=0
+
+	def _write(self,start:int,chunk:np.ndarray):
+		first=min(len(chunk),self.capacity-start)
+		for off in (0,self.capacity):
+			self._buf[off+start:off+start+first]=chunk[:first]
+			self._buf[off:off+len(chunk)-first]=chunk[first:]
+
+	def extend(self,data:Iterable):
+		"""Append a chunk, dropping the oldest samples if it doesn't fit"""
+		chunk=np.asarray(data,dtype=self._buf.dtype).ravel()
+		if len(chunk) >= self.capacity:
+			chunk=chunk[-self.capacity:]
+		self._write(self._head,chunk)
+		self._head=(self._head+len(chunk))%self.capacity
+		self.size=min(self.size+len(chunk),self.capacity)
+
+	def clear(self):
+		self._head=0
+		self.size=0
+
+	@property
+	def last(self):
+		"""the newest sample"""
+		if self.size==0:
+			raise IndexError("RingBuffer is empty")
+		return self._buf[self._head+self.capacity-1]
+
+	def view(self) -> np.ndarray:
+		"""the buffered samples, oldest first. Only valid until the next extend"""
+		end=self._head+self.capacity
+		return self._buf[end-self.size:end]
+
+	def __len__(self):
+		return self.size
@@ -0,0 +1,349 @@
+"""
+File-backed traces, read a range at a time so a capture never has to fit in memory
+"""
+
+import os
+import numpy as np
+from os import path
+from typing import Iterator
+from .decimate import minmax_indices, logminmax_indices, decimate
+
+__all__=['Source','ArraySource','NpySource','RawSource','ArrowSource','csv_chunks']
+
+def _file_id(pth:str) -> tuple:
+	# enough to tell whether the file has changed without reading it
+	st=os.stat(pth)
+	return (path.abspath(pth),st.st_size,st.st_mtime_ns)
+
+class Source:
+	"""
+	A 1-D trace too long to draw whole, usually one that lives in a file. Subclasses
+	say how to get a range of samples;
+	`read` uses that to give the data for a view, reduced to the resolution asked for,
+	while only ever holding `chunk` samples of the file in memory at once.
+
+	By default the samples are evenly spaced: sample i is at x0+i*dt.
+	"""
+	x0:float
+	dt:float
+	name:str
+	chunk:int=1<<22
+	def __init__(self,x0:float=0.0,dt:float=1.0,name:str=""):
+		self.x0=x0
+		self.dt=dt
+		self.name=name
+
+	def __len__(self) -> int:
+		raise NotImplementedError
+
+	def y(self,start:int,stop:int) -> np.ndarray:
+		"""the samples in [start,stop)"""
+		raise NotImplementedError
+
+	def x(self,start:int,stop:int) -> np.ndarray:
+		"""the x of the samples in [start,stop)"""
+		return self.x0+self.dt*np.arange(start,stop)
+
+	def index(self,xval:float) -> int:
+		"""the index of the first sample at or after xval, clipped to the data"""
+		i=int(np.ceil((xval-self.x0)/self.dt))
+		return min(max(i,0),len(self))
+
+	def fingerprint(self) -> tuple:
+		"""what the data depends on, for telling whether a plot of it is up to date"""
+		return (type(self).__name__,self.x0,self.dt,self.name)
+
+	@property
+	def numeric_x(self) -> bool:
+		"""whether x can be compared with plain axis limits (not e.g. dates)"""
+		return True
+
+	@property
+	def evenly_spaced(self) -> bool:
+		"""whether x is x0+i*dt, rather than read from somewhere"""
+		return True
+
+	def read(self,xlim:tuple[float,float]|None=None,max_points:int|None=None,method:str="minmax") -> tuple[np.ndarray,np.ndarray]:
+		"""
+		Get the data to draw.
+
+		Parameters
+		----------
+		xlim:tuple[float,float]|None
+			The part of the trace to read, the whole thing if None. One sample either
+			side is included so the line runs to the edge of the view.
+		max_points:int|None
+			If there are more samples than this in the range, reduce them with a
+			min/max envelope to about this many points
+		method:str
+			"minmax" for bins of equal count, "log" for bins of equal width in log(x),
+			for a log x axis (see decimate.logminmax)
+
+		Return
+		------
+		tuple[np.ndarray,np.ndarray]
+			x and y, in memory
+		"""
+		start,stop=0,len(self)
+		if xlim is not None:
+			start=max(self.index(xlim[0])-1,0)
+			stop=min(self.index(xlim[1])+1,len(self))
+		n=stop-start
+		if max_points is None or n <= max_points:
+			return self.x(start,stop),np.array(self.y(start,stop))
+		n_bins=max(max_points//2,1)
+		if method=="log":
+			first=max(self.index(np.nextafter(0.0,1.0)),start)
+			# x0+i*dt can round down to 0 where it should be just above
+			if first < stop and self.x(first,first+1)[0] <= 0:
+				first+=1
+			# samples at x <= 0 can't be shown on a log axis, so they're not read at all;
+			# with nothing that can be there's no span to bin
+			if first < stop:
+				return self._read_log(first,stop,n_bins,(float(self.x(first,first+1)[0]),float(self.x(stop-1,stop)[0])))
+		per_bin=n//n_bins
+		bins_per_chunk=max(self.chunk//per_bin,1)
+		xs=[]
+		ys=[]
+		for b in range(0,n_bins,bins_per_chunk):
+			lo=start+b*per_bin
+			last=b+bins_per_chunk >= n_bins
+			hi=stop if last else lo+bins_per_chunk*per_bin
+			y=self.y(lo,hi)
+			keep=minmax_indices(y,min(bins_per_chunk,n_bins-b))
+			ys.append(np.array(y[keep]))
+			xs.append(self.x(lo,hi)[keep])
+		return np.concatenate(xs),np.concatenate(ys)
+
+	def _read_log(self,start:int,stop:int,n_bins:int,span:tuple[float,float]):
+		xs=[]
+		ys=[]
+		for lo in range(start,stop,self.chunk):
+			hi=min(lo+self.chunk,stop)
+			x=np.asarray(self.x(lo,hi))
+			y=np.asarray(self.y(lo,hi))
+			keep=logminmax_indices(x,y,n_bins,span)
+			xs.append(x[keep])
+			ys.append(np.array(y[keep]))
+		return np.concatenate(xs),np.concatenate(ys)
+
+class ArraySource(Source):
+	"""
+	A trace that is already in memory, kept at full resolution so it can be reduced
+	again for each view. x has to be sorted.
+	"""
+	def __init__(self,x,y,method:str="minmax",name:str=""):
+		super().__init__(name=name)
+		self._xs=np.asarray(x)
+		self._ys=np.asarray(y)
+		self.method=method
+
+	def __len__(self):
+		return len(self._ys)
+
+	def y(self,start,stop):
+		return self._ys[start:stop]
+
+	def x(self,start,stop):
+		return self._xs[start:stop]
+
+	def index(self,xval):
+		return int(np.searchsorted(self._xs,xval,side='left'))
+
+	@property
+	def numeric_x(self):
+		return self._xs.dtype.kind in 'iuf'
+
+	@property
+	def evenly_spaced(self):
+		return False
+
+	def fingerprint(self):
+		return (type(self).__name__,self.name,self.method,self._xs,self._ys)
+
+	def read(self,xlim=None,max_points=None,method=None):
+		method=self.method if method is None else method
+		if method=="minmax":
+			return super().read(xlim,max_points)
+		x,y=super().read(xlim,None)
+		if max_points is None:
+			return x,y
+		return decimate(x,y,method,max(max_points//4,1))
+
+class NpySource(Source):
+	"""
+	A .npy file, memory mapped. For a 2-D array, `column` picks the trace.
+	"""
+	def __init__(self,pth:str,x0:float=0.0,dt:float=1.0,column:int|None=None,name:str=""):
+		super().__init__(x0,dt,name)
+		self.path=pth
+		self.column=column
+		data=np.load(pth,mmap_mode='r')
+		self.data=data if column is None else data[:,column]
+
+	def fingerprint(self):
+		return super().fingerprint()+(_file_id(self.path),self.column)
+
+	def __len__(self):
+		return len(self.data)
+
+	def y(self,start,stop):
+		return self.data[start:stop]
+
+class RawSource(Source):
+	"""
+	A headerless binary dump, e.g. from a scope, memory mapped.
+
+	Parameters
+	----------
+	pth:str
+		The file
+	dtype
+		The sample type, e.g. '<i2' for little-endian int16 or '<f4' for float32
+	rate:float
+		The sample rate, in samples per unit of x
+	offset:int
+		The number of bytes to skip at the start of the file (a header)
+	channels:int
+		The number of interleaved channels in the file
+	channel:int
+		The channel to read
+	scale:float
+	y_offset:float
+		Samples are converted with y=raw*scale+y_offset, a chunk at a time
+	x0:float
+		The x of the first sample
+	"""
+	def __init__(self,pth:str,dtype='<i2',rate:float=1.0,offset:int=0,
+			channels:int=1,channel:int=0,scale:float=1.0,y_offset:float=0.0,
+			x0:float=0.0,name:str=""):
+		super().__init__(x0,1/rate,name)
+		self.path=pth
+		self._params=(np.dtype(dtype).str,offset,channels,channel)
+		raw=np.memmap(pth,dtype=np.dtype(dtype),mode='r',offset=offset)
+		raw=raw[:len(raw)//channels*channels]
+		self.data=raw.reshape(-1,channels)[:,channel]
+		self.scale=scale
+		self.y_offset=y_offset
+
+	def __len__(self):
+		return len(self.data)
+
+	def fingerprint(self):
+		return super().fingerprint()+(_file_id(self.path),self._params,self.scale,self.y_offset)
+
+	def y(self,start,stop):
+		chunk=self.data[start:stop]
+		if self.scale==1.0 and self.y_offset==0.0:
+			return chunk
+		return chunk*self.scale+self.y_offset
+
+class ArrowSource(Source):
+	"""
+	A column of an Arrow IPC (Feather v2) file, memory mapped.
+
+	If `x` names a column, that is used for x (it has to be sorted); otherwise the
+	samples are taken to be evenly spaced from x0 in steps of dt.
+
+	Record batches are only read as they're needed. Uncompressed, that's zero-copy
+	from the map; feather compresses with lz4 by default though, and then each batch
+	a read touches is decompressed (just the columns used), a few kept at a time.
+	"""
+	batches_kept:int=4
+	def __init__(self,pth:str,y:str,x:str|None=None,x0:float=0.0,dt:float=1.0,name:str=""):
+		import pyarrow as pa
+		super().__init__(x0,dt,name or y)
+		self.path=pth
+		self._columns=(y,x)
+		self._mmap=pa.memory_map(pth,'r')
+		schema=pa.ipc.open_file(self._mmap).schema
+		fields=[schema.get_field_index(c) for c in self._columns if c is not None]
+		if -1 in fields:
+			missing=[c for c in self._columns if c is not None and schema.get_field_index(c)==-1]
+			raise KeyError(f"{pth} has no column {missing[0]!r}")
+		self._reader=pa.ipc.open_file(self._mmap,options=pa.ipc.IpcReadOptions(included_fields=fields))
+		self._batches={}
+		rows=[self._batch(i).num_rows for i in range(self._reader.num_record_batches)]
+		# batch i holds the samples [_offsets[i],_offsets[i+1])
+		self._offsets=np.concatenate([[0],np.cumsum(rows,dtype=np.int64)])
+
+	def __len__(self):
+		return int(self._offsets[-1])
+
+	def fingerprint(self):
+		return super().fingerprint()+(_file_id(self.path),self._columns)
+
+	def _batch(self,i:int):
+		if i not in self._batches:
+			if len(self._batches) >= self.batches_kept:
+				del self._batches[next(iter(self._batches))]
+			self._batches[i]=self._reader.get_batch(i)
+		return self._batches[i]
+
+	def _numpy(self,col:str,start:int,stop:int) -> np.ndarray:
+		n_batches=len(self._offsets)-1
+		if not n_batches:
+			return np.empty(0)
+		i=min(max(int(np.searchsorted(self._offsets,start,side='right'))-1,0),n_batches-1)
+		parts=[]
+		while True:
+			lo=int(self._offsets[i])
+			n=max(min(stop,int(self._offsets[i+1]))-start,0)
+			# zero-copy unless the batch is compressed or the range has nulls
+			parts.append(self._batch(i).column(col).slice(start-lo,n).to_numpy(zero_copy_only=False))
+			start+=n
+			i+=1
+			if start >= stop or i==n_batches:
+				break
+		return parts[0] if len(parts)==1 else np.concatenate(parts)
+
+	def y(self,start,stop):
+		return self._numpy(self._columns[0],start,stop)
+
+	def x(self,start,stop):
+		if self._columns[1] is None:
+			return super().x(start,stop)
+		return self._numpy(self._columns[1],start,stop)
+
+	@property
+	def evenly_spaced(self):
+		return self._columns[1] is None
+
+	def index(self,xval):
+		if self._columns[1] is None:
+			return super().index(xval)
+		lo,hi=0,len(self)
+		while lo < hi:
+			mid=(lo+hi)//2
+			if self.x(mid,mid+1)[0] < xval:
+				lo=mid+1
+			else:
+				hi=mid
+		return lo
+
+def csv_chunks(pth:str,y:str,x:str|None=None,chunksize:int=1<<20,engine:str="pandas",**read_args) -> Iterator[tuple[np.ndarray|None,np.ndarray]]:
+	"""
+	Read the column y, and x if given, of a CSV file a chunk at a time, yielding
+	(x,y) as numpy arrays, x None if it wasn't asked for. CSV can't be read from the
+	middle, so unlike a Source this only goes through the file once, front to back.
+
+	engine="pandas" reads `chunksize` rows at a time with read_csv; "pyarrow" uses
+	pyarrow's streaming reader, which parses on several threads and is a lot faster,
+	in blocks of chunksize*32 bytes (about chunksize rows of a few numbers).
+	read_args go to read_csv or pyarrow.csv.open_csv.
+	"""
+	cols=[y] if x is None else [x,y]
+	if engine=="pandas":
+		import pandas as pd
+		with pd.read_csv(pth,usecols=cols,chunksize=chunksize,**read_args) as reader:
+			for df in reader:
+				yield (None if x is None else df[x].to_numpy()),df[y].to_numpy()
+	elif engine=="pyarrow":
+		from pyarrow import csv
+		reader=csv.open_csv(pth,read_options=csv.ReadOptions(block_size=chunksize*32),
+					  convert_options=csv.ConvertOptions(include_columns=cols),**read_args)
+		for batch in reader:
+			xs=None if x is None else batch.column(x).to_numpy(zero_copy_only=False)
+			yield xs,batch.column(y).to_numpy(zero_copy_only=False)
+	else:
+		raise ValueError(f"engine should be 'pandas' or 'pyarrow', got '{engine}'")
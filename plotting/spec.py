@@ -0,0 +1,153 @@
+"""
+Recording the calls that build a figure, to save them and draw the figure again later
+"""
+
+import json
+import numpy as np
+from os import path
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+	from . import figure_wrapper
+	from .batch import FigureJob
+
+__all__=['FigureSpec','Unrecordable']
+
+VERSION=1
+
+class Unrecordable(TypeError):
+	"""raised for a value that can't be stored in a spec"""
+
+class FigureSpec:
+	"""
+	The calls made on a figure_wrapper, as (name,args,kwargs), and the arguments it
+	was made with, enough to draw the same figure again with `replay`, in this
+	process or another one.
+
+	`save` writes the calls to a JSON file and every array in them to an .npz
+	sidecar next to it, so the spec of an expensive analysis can be kept and drawn
+	again at another size, style or format without redoing the analysis.
+
+	Calls that take something that can't be stored (a function for pfunc, a file
+	Source...) are recorded as the calls they make in turn, e.g. pfunc as the plot
+	of the values it computed. Arrays are copied as they're recorded, so changing
+	them afterwards doesn't change the figure; pandas objects are saved as their
+	values.
+	"""
+	calls:list
+	wrapper_args:dict
+	def __init__(self,wrapper_args:dict|None=None,calls:list|None=None):
+		self.wrapper_args=dict(wrapper_args or {})
+		self.calls=list(calls or [])
+
+	def __len__(self):
+		return len(self.calls)
+
+	def record(self,name:str,args:tuple,kwargs:dict) -> bool:
+		"""Add a call, returning False if it can't be stored"""
+		try:
+			_encode((args,kwargs),[])
+		except Unrecordable:
+			return False
+		self.calls.append((name,_snapshot(args),_snapshot(kwargs)))
+		return True
+
+	def replay(self,fw:'figure_wrapper|None'=None,**wrapper_args) -> 'figure_wrapper':
+		"""
+		Make the calls on fw, or on a new figure_wrapper made with the recorded
+		arguments updated by wrapper_args (e.g. outf, headless, figsize), and return
+		it. As with any figure_wrapper, the output is saved when it's used as a context
+		manager and the block ends:
+
+			with spec.replay(outf="big.pdf",figsize=(12,6)):
+				pass
+		"""
+		if fw is None:
+			from . import figure_wrapper
+			fw=figure_wrapper(**(self.wrapper_args|wrapper_args))
+		for name,args,kwargs in self.calls:
+			if isinstance(getattr(type(fw),name,None),property):
+				setattr(fw,name,args[0])
+			else:
+				getattr(fw,name)(*args,**kwargs)
+		return fw
+
+	def job(self,outfile:str,**wrapper_args) -> 'FigureJob':
+		"""A FigureJob that replays the spec, for render_batch"""
+		from .batch import FigureJob
+		job=FigureJob(outfile,**(self.wrapper_args|wrapper_args))
+		job.calls=list(self.calls)
+		return job
+
+	def save(self,pth:str,compress:bool=False):
+		"""
+		Write the spec to pth (JSON) and its arrays to the sidecar with the same name
+		and .npz extension, compressed if `compress`
+		"""
+		arrays=[]
+		doc={'version':VERSION,
+			 'wrapper':_encode(self.wrapper_args,arrays),
+			 'calls':[[name,_encode(list(args),arrays),_encode(kwargs,arrays)] for name,args,kwargs in self.calls]}
+		with open(pth,'w') as f:
+			json.dump(doc,f,indent=1)
+		savez=np.savez_compressed if compress else np.savez
+		savez(_sidecar(pth),**{f"a{i}":a for i,a in enumerate(arrays)})
+
+	@classmethod
+	def load(cls,pth:str) -> 'FigureSpec':
+		with open(pth) as f:
+			doc=json.load(f)
+		if doc.get('version')!=VERSION:
+			raise ValueError(f"{pth} is a version {doc.get('version')} spec, expected {VERSION}")
+		with np.load(_sidecar(pth),allow_pickle=False) as npz:
+			arrays=[npz[f"a{i}"] for i in range(len(npz.files))]
+		calls=[(name,tuple(_decode(args,arrays)),_decode(kwargs,arrays)) for name,args,kwargs in doc['calls']]
+		return cls(_decode(doc['wrapper'],arrays),calls)
+
+def _sidecar(pth:str) -> str:
+	return path.splitext(pth)[0]+".npz"
+
+def _encode(obj,arrays:list):
+	"""
+	obj as JSON, with arrays appended to `arrays` and replaced by their index.
+	Tuples and arrays are tagged so they come back as they went in.
+	"""
+	if obj is None or isinstance(obj,(bool,int,float,str)):
+		return obj
+	if isinstance(obj,np.generic):
+		return _encode(obj.item(),arrays)
+	if isinstance(obj,(list,tuple)):
+		items=[_encode(o,arrays) for o in obj]
+		return items if isinstance(obj,list) else {'tuple':items}
+	if isinstance(obj,dict):
+		if not all(isinstance(k,str) for k in obj):
+			raise Unrecordable("only dicts with str keys can be recorded")
+		return {'dict':{k:_encode(v,arrays) for k,v in obj.items()}}
+	if hasattr(obj,'__array__') and not hasattr(obj,'read'):
+		a=np.asarray(obj)
+		if a.dtype.hasobject:
+			raise Unrecordable(f"can't record an array of python objects")
+		arrays.append(a)
+		return {'array':len(arrays)-1}
+	raise Unrecordable(f"can't record a {type(obj).__name__}")
+
+def _snapshot(obj):
+	"""obj with the arrays in it copied, in the containers _encode accepts"""
+	if isinstance(obj,(list,tuple)):
+		return type(obj)(_snapshot(o) for o in obj)
+	if isinstance(obj,dict):
+		return {k:_snapshot(v) for k,v in obj.items()}
+	if hasattr(obj,'__array__') and hasattr(obj,'copy'):
+		# ndarray.copy, or a deep copy of a pandas object
+		return obj.copy()
+	return obj
+
+def _decode(obj,arrays:list):
+	if isinstance(obj,list):
+		return [_decode(o,arrays) for o in obj]
+	if isinstance(obj,dict):
+		if 'array' in obj:
+			return arrays[obj['array']]
+		if 'tuple' in obj:
+			return tuple(_decode(o,arrays) for o in obj['tuple'])
+		return {k:_decode(v,arrays) for k,v in obj['dict'].items()}
+	return obj
@@ -0,0 +1,145 @@
+"""
+Welch power spectra of traces too long for one FFT, for figure_wrapper.spectrum
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Iterable
+from .sources import Source
+
+__all__=['welch','log_average','WINDOWS','SCALINGS']
+
+# periodic windows, as spectral analysis wants them, rather than numpy's symmetric ones
+WINDOWS={
+	"hann":lambda n:np.hanning(n+1)[:-1],
+	"hamming":lambda n:np.hamming(n+1)[:-1],
+	"blackman":lambda n:np.blackman(n+1)[:-1],
+	"boxcar":np.ones,
+}
+SCALINGS=("density","spectrum","magnitude")
+
+def _window(window,n:int) -> np.ndarray:
+	if isinstance(window,str):
+		if window not in WINDOWS:
+			raise ValueError(f"Unknown window '{window}', expected one of {tuple(WINDOWS)} or an array")
+		return WINDOWS[window](n)
+	w=np.asarray(window,dtype=float)
+	if w.shape != (n,):
+		raise ValueError(f"the window should be nperseg={n} long, got {w.shape}")
+	return w
+
+def welch(y:'Iterable|Source',
+		  fs:float=1.0,
+		  nperseg:int=4096,
+		  overlap:float=0.5,
+		  window="hann",
+		  scaling:str="density",
+		  detrend:bool=True,
+		  chunk:int=1<<22,
+		  parallel:str="",
+		  workers:int|None=None) -> tuple[np.ndarray,np.ndarray]:
+	"""
+	The one-sided spectrum of y, averaged over windowed segments (Welch's method).
+
+	y is read about `chunk` samples' worth of segments at a time, so a Source of any
+	length only ever has a few chunks (per worker) in memory. The result is the same as
+	scipy.signal.welch for the same settings.
+
+	Parameters
+	----------
+	y:Iterable|Source
+		The samples
+	fs:float
+		The sample rate
+	nperseg:int
+		The length of each segment, which sets the resolution to fs/nperseg
+	overlap:float
+		The fraction of each segment shared with the next one
+	window
+		The name of a window in WINDOWS, or the window itself, nperseg long
+	scaling:str
+		"density" for the power spectral density (V**2/Hz), "spectrum" for the power
+		spectrum (V**2), "magnitude" for the amplitude spectrum (V rms)
+	detrend:bool
+		Take the mean off every segment first
+	chunk:int
+		The total length of the segments transformed at a time
+	parallel:str
+		"thread" to transform the chunks on a thread pool, numpy's FFT releases the GIL
+	workers:int|None
+		The size of the pool, defaults to the number of CPUs
+
+	Return
+	------
+	tuple[np.ndarray,np.ndarray]
+		The frequencies and the spectrum at them
+	"""
+	if scaling not in SCALINGS:
+		raise ValueError(f"scaling should be one of {SCALINGS}, got '{scaling}'")
+	if parallel not in ("","thread"):
+		raise ValueError(f"parallel should be '' or 'thread', got '{parallel}'")
+	if isinstance(y,Source):
+		read=y.y
+	else:
+		y=np.asarray(y)
+		read=lambda start,stop:y[start:stop]
+	n=len(y)
+	if n < nperseg:
+		raise ValueError(f"need at least nperseg={nperseg} samples, got {n}")
+	step=max(nperseg-int(overlap*nperseg),1)
+	n_seg=(n-nperseg)//step+1
+	# the segments of a read overlap, so it's their total length that's kept to about a chunk
+	per_read=max(chunk//nperseg,1)
+	win=_window(window,nperseg)
+
+	def transform(first:int) -> np.ndarray:
+		count=min(per_read,n_seg-first)
+		start=first*step
+		data=np.asarray(read(start,start+(count-1)*step+nperseg),dtype=float)
+		segs=sliding_window_view(data,nperseg)[::step]
+		if detrend:
+			segs=segs-segs.mean(axis=1,keepdims=True)
+			segs*=win
+		else:
+			segs=segs*win
+		spec=np.fft.rfft(segs,axis=1)
+		del segs
+		return (spec.real**2+spec.imag**2).sum(axis=0)
+
+	firsts=range(0,n_seg,per_read)
+	if parallel and len(firsts) > 1:
+		with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+			total=sum(pool.map(transform,firsts))
+	else:
+		total=sum(transform(f) for f in firsts)
+	power=total/n_seg
+	if scaling=="density":
+		power/=fs*(win**2).sum()
+	else:
+		power/=win.sum()**2
+	# fold the negative frequencies onto the positive ones
+	power[1:-1 if nperseg%2==0 else None]*=2
+	freqs=np.fft.rfftfreq(nperseg,1/fs)
+	if scaling=="magnitude":
+		power=np.sqrt(power)
+	return freqs,power
+
+def log_average(f:np.ndarray,p:np.ndarray,n_bins:int) -> tuple[np.ndarray,np.ndarray]:
+	"""
+	Average a spectrum over `n_bins` log-spaced frequency bins, so it has about as many
+	points per decade at the top as at the bottom. Power is averaged, which also
+	smooths out the noise; bins at the low end with a single frequency are kept as
+	they are and empty ones dropped. f has to be positive and increasing.
+	"""
+	if n_bins < 1 or len(f) <= n_bins:
+		return f,p
+	edges=np.geomspace(f[0],f[-1],n_bins+1)
+	idx=np.searchsorted(edges,f,side='right')-1
+	idx[-1]=n_bins-1
+	counts=np.bincount(idx,minlength=n_bins)
+	keep=counts > 0
+	fb=np.bincount(idx,weights=f,minlength=n_bins)[keep]/counts[keep]
+	pb=np.bincount(idx,weights=p,minlength=n_bins)[keep]/counts[keep]
+	return fb,pb
@@ -0,0 +1,40 @@
+"""
+`import plotting` stays cheap: the backends and pandas are only loaded once
+something needs them
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+HEAVY=("pandas","matplotlib","PyQt5","pyqtgraph","pyarrow","scipy")
+# what plotting adds on top of numpy, as a multiple of numpy's own import so slow
+# machines scale both; loading a backend or pandas up front costs several times this
+BUDGET=float(os.environ.get("PLOTTING_IMPORT_BUDGET",2.0))
+
+_SCRIPT=f"""
+import json,sys,time
+t=time.perf_counter()
+import numpy
+t_numpy=time.perf_counter()-t
+t=time.perf_counter()
+import plotting
+t=time.perf_counter()-t
+print(json.dumps({{"seconds":t,"numpy":t_numpy,"loaded":[m for m in {HEAVY!r} if m in sys.modules]}}))
+"""
+
+def _import() -> dict:
+	root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	env=dict(os.environ,PYTHONPATH=os.pathsep.join([root,os.environ.get("PYTHONPATH","")]))
+	out=subprocess.run([sys.executable,"-c",_SCRIPT],env=env,cwd=root,capture_output=True,text=True,check=True)
+	return json.loads(out.stdout.splitlines()[-1])
+
+def test_no_heavy_imports():
+	assert _import()["loaded"]==[]
+
+def test_import_time():
+	# the first run may be compiling bytecode, so take the best of a few
+	runs=[_import() for _ in range(3)]
+	best=min(r["seconds"]/r["numpy"] for r in runs)
+	assert best < BUDGET,runs
@@ -0,0 +1,65 @@
+"""
+The headless figure pool: figures are reused, pyplot never sees them,
+and memory stays bounded however many are rendered
+"""
+
+import gc
+import io
+import os
+import sys
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import pyplot as plt
+from plotting import figure_wrapper
+from plotting.mpl import pool
+
+# a few hundred by default so a plain pytest run stays quick; the full soak is
+# PLOTTING_SOAK_FIGURES=10000, about 7 minutes
+SOAK_FIGURES=int(os.environ.get("PLOTTING_SOAK_FIGURES",400))
+
+def _render(tighten:bool,x,y) -> bytes:
+	fw=figure_wrapper(headless=True,tighten=tighten)
+	fw.plot(x,y,name="trace")
+	fw.set_labels("a long x label to make tight_layout move the margins","y")
+	buf=io.BytesIO()
+	if tighten:
+		fw.fig.tight_layout()
+	fw.fig.fig.savefig(buf,format="png")
+	fw.close()
+	return buf.getvalue()
+
+def test_released_figure_is_like_new():
+	x=np.linspace(0,1,100)
+	y=np.sin(x)
+	pool._free.clear()
+	fresh=_render(False,x,y)
+	_render(True,x,y)
+	# the tight_layout margins of the last job mustn't show up in this one
+	assert _render(False,x,y)==fresh
+
+def test_soak():
+	x=np.linspace(0,1,200)
+	y=np.sin(20*x)
+	pool._free.clear()
+	def batch(n):
+		for i in range(n):
+			with figure_wrapper(headless=True) as fw:
+				fw.plot(x,y+i,name=f"run {i}")
+				fw.set_labels("x","y")
+				fw.fig.fig.canvas.draw()
+	# warm up, so caches filled on the first figures don't count as growth
+	batch(100)
+	gc.collect()
+	start=sys.getallocatedblocks()
+	batch(SOAK_FIGURES//2)
+	gc.collect()
+	half=sys.getallocatedblocks()
+	batch(SOAK_FIGURES-SOAK_FIGURES//2)
+	gc.collect()
+	end=sys.getallocatedblocks()
+	assert plt.get_fignums()==[]
+	assert len(pool)==1
+	# once warm the heap stays flat; leaking even one small object per figure would
+	# add one block per figure over the second half
+	assert end-half < SOAK_FIGURES//8,(start,half,end)
@@ -0,0 +1,61 @@
+"""
+The pyqtgraph backend, run offscreen so it needs no display
+"""
+
+import os
+os.environ.setdefault("QT_QPA_PLATFORM","offscreen")
+import numpy as np
+import pytest
+pytest.importorskip("pyqtgraph")
+from plotting import figure_wrapper
+from plotting.sources import NpySource
+
+def test_save_offscreen(tmp_path):
+	with figure_wrapper(backend="pqg",headless=True) as fw:
+		fw.plot(np.arange(1000),np.sin(np.arange(1000)/50),name="sin")
+		fw.set_labels("x","y")
+		fw.save(str(tmp_path/"fig"),formats=("png","svg"))
+	assert (tmp_path/"fig.png").read_bytes()[:8]==b"\x89PNG\r\n\x1a\n"
+	assert b"<svg" in (tmp_path/"fig.svg").read_bytes()[:1000]
+
+def test_pixel_width_before_layout():
+	with figure_wrapper(backend="pqg",headless=True) as fw:
+		assert fw.fig.pixel_width > 100
+
+def test_arrays_are_given_whole():
+	# the curve downsamples to the view itself, so it needs all of the data to zoom into
+	n=1_000_000
+	with figure_wrapper(backend="pqg",headless=True,decimate="minmax") as fw:
+		fw.plot(np.arange(n),np.random.default_rng(0).random(n))
+		assert len(fw.fig.axis.listDataItems()[0].xData)==n
+
+def test_sources_reread_on_zoom(tmp_path):
+	n=1_000_000
+	np.save(tmp_path/"y.npy",np.sin(np.arange(n)*1e-3))
+	with figure_wrapper(backend="pqg",headless=True) as fw:
+		fw.plot(NpySource(str(tmp_path/"y.npy")))
+		curve=fw.fig.axis.listDataItems()[0]
+		assert len(curve.xData) < n
+		fw.set_xlim(1000,2000)
+		assert (curve.xData[0],curve.xData[-1])==(999,2000)
+		fw.fig.axis.setXRange(5000,5100,padding=0)
+		assert (curve.xData[0],curve.xData[-1])==(4999,5100)
+		assert len(curve.xData)==102
+
+def test_unsupported_format(tmp_path):
+	with figure_wrapper(backend="pqg",headless=True) as fw:
+		fw.plot(np.arange(10),np.arange(10))
+		with pytest.raises(ValueError,match="pdf"):
+			fw.fig.save(str(tmp_path/"fig.pdf"))
+	assert not (tmp_path/"fig.pdf").exists()
+
+def test_describe_gives_tracked_sources(tmp_path):
+	# an exporter should get the whole file, not just what's on screen
+	n=100_000
+	np.save(tmp_path/"y.npy",np.arange(n,dtype=float))
+	with figure_wrapper(backend="pqg",headless=True) as fw:
+		fw.plot(NpySource(str(tmp_path/"y.npy")))
+		fw.set_xlim(10,20)
+		(line,)=fw.fig.describe()['axes'][0]['lines']
+		assert isinstance(line['source'],NpySource)
+		assert len(line['source'])==n
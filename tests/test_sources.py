@@ -0,0 +1,34 @@
+"""
+Reading file Sources for log x axes, a chunk at a time
+"""
+
+import numpy as np
+from plotting.decimate import logminmax
+from plotting.sources import NpySource
+
+N=1_000_000
+
+def _source(tmp_path,x0:float) -> NpySource:
+	np.save(tmp_path/"y.npy",np.random.default_rng(1).standard_normal(N))
+	return NpySource(str(tmp_path/"y.npy"),x0=x0,dt=1.0)
+
+def test_log_read_matches_in_memory(tmp_path):
+	src=_source(tmp_path,1.0)
+	x,y=src.x(0,N),src.y(0,N)
+	whole=src.read(None,2000,"log")
+	np.testing.assert_array_equal(whole[0],logminmax(x,y,1000)[0])
+	# chunks can split a bin, which then keeps the extremes of both parts, and each
+	# keeps its first and last point
+	src.chunk=100_003
+	chunked=src.read(None,2000,"log")
+	assert set(whole[0]) <= set(chunked[0])
+	assert len(chunked[0]) <= len(whole[0])+4*(N//src.chunk+1)
+	np.testing.assert_array_equal(chunked[1],y[chunked[0].astype(int)-1])
+
+def test_log_read_drops_nonpositive_x(tmp_path):
+	# half the file is at x <= 0, where a log axis can't show anything
+	src=_source(tmp_path,-N/2)
+	src.chunk=100_003
+	x,y=src.read(None,2000,"log")
+	assert x.min() > 0
+	assert len(x) < 2*2000
@@ -0,0 +1,53 @@
+"""
+The chunked Welch spectrum, against spectra known in closed form
+"""
+
+import numpy as np
+import pytest
+from plotting.spectrum import welch
+from plotting.sources import NpySource
+
+FS=1000.0
+NPERSEG=1024
+
+def test_white_noise_level():
+	# one-sided, white noise of variance s**2 has a density of 2*s**2/fs
+	s=0.5
+	y=np.random.default_rng(0).normal(0,s,1<<20)
+	f,p=welch(y,FS,NPERSEG)
+	assert f[0]==0 and f[-1]==FS/2 and len(f)==NPERSEG//2+1
+	assert abs(p[1:-1].mean()/(2*s**2/FS)-1) < 0.01
+	# and the density integrates to the variance
+	assert abs(p.sum()*(f[1]-f[0])/s**2-1) < 0.01
+
+def test_sinusoid_power():
+	# centred on a bin, a sinusoid of amplitude a has power a**2/2 there
+	a=3.0
+	f0=100*FS/NPERSEG
+	t=np.arange(1<<18)/FS
+	y=a*np.sin(2*np.pi*f0*t)
+	f,p=welch(y,FS,NPERSEG,scaling="spectrum")
+	assert f[np.argmax(p)]==f0
+	assert p.max()==pytest.approx(a**2/2,rel=1e-6)
+	f,m=welch(y,FS,NPERSEG,scaling="magnitude")
+	assert m.max()==pytest.approx(a/np.sqrt(2),rel=1e-6)
+
+@pytest.mark.parametrize("opts",[{"chunk":NPERSEG*3},{"chunk":NPERSEG*3,"parallel":"thread","workers":4}])
+def test_chunked_matches_whole(tmp_path,opts):
+	y=np.random.default_rng(1).standard_normal(300_001)
+	f,p=welch(y,FS,NPERSEG)
+	f2,p2=welch(y,FS,NPERSEG,**opts)
+	np.testing.assert_array_equal(f,f2)
+	np.testing.assert_allclose(p2,p,rtol=1e-12)
+	np.save(tmp_path/"y.npy",y)
+	_,p3=welch(NpySource(str(tmp_path/"y.npy")),FS,NPERSEG,**opts)
+	np.testing.assert_allclose(p3,p,rtol=1e-12)
+
+def test_matches_scipy():
+	signal=pytest.importorskip("scipy.signal")
+	y=np.random.default_rng(2).standard_normal(100_000)+np.linspace(0,1,100_000)
+	for scaling in ("density","spectrum"):
+		f,p=welch(y,FS,NPERSEG,overlap=0.5,scaling=scaling)
+		fs,ps=signal.welch(y,FS,"hann",NPERSEG,NPERSEG//2,scaling=scaling)
+		np.testing.assert_allclose(f,fs)
+		np.testing.assert_allclose(p,ps,rtol=1e-10)
@@ -0,0 +1,43 @@
+"""
+Separate headless figure_wrappers rendering on threads don't affect each other
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from plotting import figure_wrapper
+
+N_FIGURES=int(os.environ.get("PLOTTING_THREAD_FIGURES",64))
+
+def _render(folder,i:int) -> tuple[bytes,float]:
+	rng=np.random.default_rng(i)
+	x=np.arange(2000)
+	pth=os.path.join(folder,f"{i}.png")
+	with figure_wrapper(headless=True,figsize=(4,3),dpi=80) as fw:
+		fw.plot(x,np.cumsum(rng.standard_normal(len(x))),name=f"walk {i}")
+		fw.plot(x,rng.standard_normal(len(x))*(i%5),name="noise")
+		fw.axline(0,axis="y")
+		fw.set_labels(f"x {i}","y")
+		# the legend is made by save, in this size, which used to go through rcParams
+		fw.set_fontsize(8+i%4)
+		if i%3==0:
+			fw.set_xlim(100,200+10*i)
+		fw.save(pth)
+		legend=fw.fig.axis.get_legend()
+		size=legend.get_texts()[0].get_fontsize()
+	with open(pth,"rb") as f:
+		return f.read(),size
+
+def test_threads_match_serial(tmp_path):
+	(tmp_path/"serial").mkdir()
+	(tmp_path/"threaded").mkdir()
+	serial=[_render(str(tmp_path/"serial"),i) for i in range(N_FIGURES)]
+	with ThreadPoolExecutor(max_workers=8) as ex:
+		threaded=list(ex.map(partial(_render,str(tmp_path/"threaded")),range(N_FIGURES)))
+	assert [size for _,size in serial]==[8+i%4 for i in range(N_FIGURES)]
+	assert len({png for png,_ in serial})==N_FIGURES
+	mismatched=[i for i,(a,b) in enumerate(zip(serial,threaded)) if a!=b]
+	assert mismatched==[]